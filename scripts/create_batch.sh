@@ -31,6 +31,18 @@ while [[ $# -gt 0 ]]; do
             max_tokens="$2"
             shift 2
             ;;
+        --max-side)
+            max_side="$2"
+            shift 2
+            ;;
+        --jpeg-quality)
+            jpeg_quality="$2"
+            shift 2
+            ;;
+        --grayscale)
+            grayscale="1"
+            shift
+            ;;
         *)
             echo "Error: Unknown option $1"
             echo "Usage: $0 --provider <provider> --model <model> --split <split> --hints <hints> [--thinking-level <level>] [--thinking-budget <budget>]"
@@ -71,10 +83,25 @@ if [ -z "$hints" ]; then
 fi
 
 model_sanitized=$(echo "$model" | sed 's/[^a-zA-Z0-9-]/-/g')
+
+# Image preprocessing tag, as named by get_preprocessing_tag in src/layton_eval/image_store.py
+image_tag=""
+if [ "$split" = "vlm" ]; then
+    if [ -n "$max_side" ]; then
+        image_tag="${image_tag}_max${max_side}"
+    fi
+    if [ -n "$jpeg_quality" ]; then
+        image_tag="${image_tag}_q${jpeg_quality}"
+    fi
+    if [ -n "$grayscale" ]; then
+        image_tag="${image_tag}_gray"
+    fi
+fi
+
 if [ -n "$max_tokens" ] || [ "$provider" = "anthropic" ] || [ "$provider" = "together" ]; then
-    raw_file_path="./raw_files/benchmark_${split}_hints_${hints}_max_tokens_${max_tokens}.jsonl"
+    raw_file_path="./raw_files/benchmark_${split}_hints_${hints}_max_tokens_${max_tokens}${image_tag}.jsonl"
 else
-    raw_file_path="./raw_files/benchmark_${split}_hints_${hints}.jsonl"
+    raw_file_path="./raw_files/benchmark_${split}_hints_${hints}${image_tag}.jsonl"
 fi
 
 # Build suffix for thinking parameters
@@ -89,6 +116,7 @@ fi
 if [ "$provider" = "anthropic" ] && [ -z "$thinking_budget" ]; then
     suffix="${suffix}_nothinking"
 fi
+suffix="${suffix}${image_tag}"
 
 batch_name="benchmark_${model_sanitized}_${split}_hints_${hints}${suffix}"
 processed_file_path="./processed_files/benchmark_${provider}_${model_sanitized}_${split}_hints_${hints}${suffix}.jsonl"
@@ -107,6 +135,13 @@ if [ -n "$thinking_level" ] || [ -n "$thinking_budget" ]; then
     fi
 fi
 
+# Raw files reference images by hash, inline them in the file sent to the provider
+export_file_path=$(python src/layton_eval/image_store.py --raw-file-path "$raw_file_path")
+if [ $? -ne 0 ]; then
+    echo "Error exporting raw file: $raw_file_path"
+    exit 1
+fi
+
 # Build batchling command with optional thinking parameters
 batchling_cmd="batchling create \
     --name \"$batch_name\" \
@@ -115,7 +150,7 @@ batchling_cmd="batchling create \
     --description \"$description\" \
     --provider \"$provider\" \
     --endpoint /v1/chat/completions \
-    --raw-file-path \"$raw_file_path\" \
+    --raw-file-path \"$export_file_path\" \
     --processed-file-path \"$processed_file_path\" \
     --results-file-path \"$results_file_path\" \
     --response-format-path ./json_schemas/benchmark_answer_schema.json"
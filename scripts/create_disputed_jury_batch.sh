@@ -0,0 +1,54 @@
+#!/bin/bash
+
+# Script to create the batch of the third judge of a staged jury (see create_jury_batches.sh --staged)
+# on the predictions the first two judges disagree on, once their results are retrieved
+
+# Parse command line arguments
+while [[ $# -gt 0 ]]; do
+    case $1 in
+        --raw-file-path)
+            raw_file_path="$2"
+            shift 2
+            ;;
+        *)
+            echo "Error: Unknown option $1"
+            echo "Usage: $0 --raw-file-path <path>"
+            echo "  Example: $0 --raw-file-path ./raw_files/judge_openai.jsonl"
+            exit 1
+            ;;
+    esac
+done
+
+# Validate required parameters
+if [ -z "$raw_file_path" ]; then
+    echo "Error: --raw-file-path is required"
+    echo "Usage: $0 --raw-file-path <path>"
+    echo "  Example: $0 --raw-file-path ./raw_files/judge_openai.jsonl"
+    exit 1
+fi
+
+# Get the directory of this script
+script_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+create_judge_batch_script="${script_dir}/create_judge_batch.sh"
+
+# Check if create_judge_batch.sh exists
+if [ ! -f "$create_judge_batch_script" ]; then
+    echo "Error: create_judge_batch.sh not found at $create_judge_batch_script"
+    exit 1
+fi
+
+# Write the raw file of the disputed predictions, its path is the last line printed
+output=$(python src/layton_eval/jury.py --raw-file-path "$raw_file_path") || exit 1
+echo "$output"
+disputed_file_path=$(echo "$output" | tail -n 1)
+if [[ "$disputed_file_path" != *_disputed* ]]; then
+    echo "No disputed predictions, the jury results are final"
+    exit 0
+fi
+
+# The third judge is Anthropic's (on the max_tokens variant), Mistral's when Anthropic is judged
+if [[ "$disputed_file_path" == *_disputed_max_tokens* ]]; then
+    "${create_judge_batch_script}" --raw-file-path "$disputed_file_path" --provider anthropic --model claude-opus-4-5 --thinking-budget 32000
+else
+    "${create_judge_batch_script}" --raw-file-path "$disputed_file_path" --provider mistral --model mistral-large-2512
+fi
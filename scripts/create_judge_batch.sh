@@ -56,7 +56,7 @@ if [ -z "$model" ]; then
 fi
 
 # Extract filename without extension from raw_file_path
-raw_file_basename=$(basename "$raw_file_path")
+raw_file_basename=$(basename "${raw_file_path%.zst}")
 raw_file_name_no_extension="${raw_file_basename%.jsonl}"
 
 # Sanitize model name
@@ -83,6 +83,13 @@ if [ -n "$thinking_level" ] || [ -n "$thinking_budget" ]; then
     fi
 fi
 
+# Raw files reference images by hash, inline them in the file sent to the provider
+export_file_path=$(python src/layton_eval/image_store.py --raw-file-path "$raw_file_path")
+if [ $? -ne 0 ]; then
+    echo "Error exporting raw file: $raw_file_path"
+    exit 1
+fi
+
 # Build batchling command with optional thinking parameters
 batchling_cmd="batchling create \
     --name \"$batch_name\" \
@@ -91,7 +98,7 @@ batchling_cmd="batchling create \
     --description \"$description\" \
     --provider \"$provider\" \
     --endpoint /v1/chat/completions \
-    --raw-file-path \"$raw_file_path\" \
+    --raw-file-path \"$export_file_path\" \
     --processed-file-path \"$processed_file_path\" \
     --results-file-path \"$results_file_path\" \
     --response-format-path ./json_schemas/benchmark_judgement_schema.json"
@@ -7,9 +7,14 @@ while [[ $# -gt 0 ]]; do
             raw_file_path="$2"
             shift 2
             ;;
+        --staged)
+            # Only the first two judges, see create_disputed_jury_batch.sh for the third one
+            staged="true"
+            shift
+            ;;
         *)
             echo "Error: Unknown option $1"
-            echo "Usage: $0 --raw-file-path <path>"
+            echo "Usage: $0 --raw-file-path <path> [--staged]"
             echo "  Example: $0 --raw-file-path ./raw_files/judge_openai.jsonl"
             exit 1
             ;;
@@ -24,8 +29,11 @@ if [ -z "$raw_file_path" ]; then
     exit 1
 fi
 
+# Compressed raw files are passed by their uncompressed name
+raw_file_path="${raw_file_path%.zst}"
+
 # Check if raw file exists
-if [ ! -f "$raw_file_path" ]; then
+if [ ! -f "$raw_file_path" ] && [ ! -f "$raw_file_path.zst" ]; then
     echo "Error: Raw file not found: $raw_file_path"
     exit 1
 fi
@@ -55,22 +63,35 @@ if [[ "$excluded_provider" != "openai" && "$excluded_provider" != "gemini" && "$
     excluded_provider="mistral"
 fi
 
+# A staged jury calls its third judge later, on the predictions the first two disagree on
+skipped_provider=""
+if [ -n "$staged" ]; then
+    if [ "$excluded_provider" != "anthropic" ]; then
+        skipped_provider="anthropic"
+    else
+        skipped_provider="mistral"
+    fi
+fi
+
 echo "Creating jury batches for raw file: $raw_file_path"
 if [ -n "$excluded_provider" ]; then
     echo "Excluding judges from same provider: $excluded_provider"
 fi
+if [ -n "$skipped_provider" ]; then
+    echo "Staged jury, judge left for disputed predictions: $skipped_provider"
+fi
 echo ""
 
 # Create batches for jury models (TODO.md lines 39-42), excluding same provider
-if [ "$excluded_provider" != "openai" ]; then
+if [ "$excluded_provider" != "openai" ] && [ "$skipped_provider" != "openai" ]; then
     "${create_judge_batch_script}" --raw-file-path "${raw_file_path}" --provider openai --model gpt-5.1 --thinking-level high
 fi
-if [ "$excluded_provider" != "gemini" ]; then
+if [ "$excluded_provider" != "gemini" ] && [ "$skipped_provider" != "gemini" ]; then
     "${create_judge_batch_script}" --raw-file-path "${raw_file_path}" --provider gemini --model gemini-3-pro-preview --thinking-level high
 fi
-if [ "$excluded_provider" != "anthropic" ]; then
+if [ "$excluded_provider" != "anthropic" ] && [ "$skipped_provider" != "anthropic" ]; then
     "${create_judge_batch_script}" --raw-file-path "${raw_file_path%.jsonl}_max_tokens.jsonl" --provider anthropic --model claude-opus-4-5 --thinking-budget 32000
 fi
-if [ "$excluded_provider" != "mistral" ]; then
+if [ "$excluded_provider" != "mistral" ] && [ "$skipped_provider" != "mistral" ]; then
     "${create_judge_batch_script}" --raw-file-path "${raw_file_path}" --provider mistral --model mistral-large-2512
 fi
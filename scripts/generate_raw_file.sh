@@ -6,6 +6,9 @@
 split=""
 hints=""
 max_tokens=""
+max_side=""
+jpeg_quality=""
+grayscale=""
 
 while [[ $# -gt 0 ]]; do
     case $1 in
@@ -21,9 +24,21 @@ while [[ $# -gt 0 ]]; do
             max_tokens="$2"
             shift 2
             ;;
+        --max-side)
+            max_side="$2"
+            shift 2
+            ;;
+        --jpeg-quality)
+            jpeg_quality="$2"
+            shift 2
+            ;;
+        --grayscale)
+            grayscale="1"
+            shift
+            ;;
         *)
             echo "Error: Unknown option $1"
-            echo "Usage: $0 --split <vlm|llm> --hints <int> [--max-tokens <int>]"
+            echo "Usage: $0 --split <vlm|llm> --hints <int> [--max-tokens <int>] [--max-side <pixels>] [--jpeg-quality <int>] [--grayscale]"
             exit 1
             ;;
     esac
@@ -32,25 +47,31 @@ done
 # Validate required parameters
 if [ -z "$split" ]; then
     echo "Error: --split is required"
-    echo "Usage: $0 --split <vlm|llm> --hints <int> [--max-tokens <int>]"
+    echo "Usage: $0 --split <vlm|llm> --hints <int> [--max-tokens <int>] [--max-side <pixels>] [--jpeg-quality <int>] [--grayscale]"
     exit 1
 fi
 
 if [ -z "$hints" ]; then
     echo "Error: --hints is required"
-    echo "Usage: $0 --split <vlm|llm> --hints <int> [--max-tokens <int>]"
+    echo "Usage: $0 --split <vlm|llm> --hints <int> [--max-tokens <int>] [--max-side <pixels>] [--jpeg-quality <int>] [--grayscale]"
     exit 1
 fi
 
 echo "Running: split=$split, hints=$hints, max_tokens=$max_tokens"
 
+python_args="--split $split --hints $hints"
 if [ -n "$max_tokens" ]; then
-    python src/layton_eval/benchmark/generate_raw_file.py \
-        --split "$split" \
-        --hints "$hints" \
-        --max-tokens "$max_tokens"
-else
-    python src/layton_eval/benchmark/generate_raw_file.py \
-        --split "$split" \
-        --hints "$hints"
+    python_args="$python_args --max-tokens $max_tokens"
 fi
+# Image preprocessing, see src/layton_eval/image_store.py
+if [ -n "$max_side" ]; then
+    python_args="$python_args --max-side $max_side"
+fi
+if [ -n "$jpeg_quality" ]; then
+    python_args="$python_args --jpeg-quality $jpeg_quality"
+fi
+if [ -n "$grayscale" ]; then
+    python_args="$python_args --grayscale"
+fi
+
+python src/layton_eval/benchmark/generate_raw_file.py $python_args
@@ -1,27 +1,15 @@
 #!/bin/bash
 
-# Grid search for all parameter combinations
+# Generate the raw files of every parameter combination in a single process
 # splits: vlm, llm
-# max_tokens: false, true
+# max_tokens: without, and with the value of --max-tokens if given
 # hints: 0, 1, 2, 3, 4
+# Other arguments (e.g. --max-tokens 64000, --max-side 768, --workers 4) are passed through.
 
-for split in "vlm" "llm"; do
-    for max_tokens in false true; do
-        for hints in 0 1 2 3 4; do
-            echo "Running: split=$split, max_tokens=$max_tokens, hints=$hints"
-
-            if [ "$max_tokens" = "true" ]; then
-                python src/layton_eval/benchmark/generate_raw_file.py \
-                    --split "$split" \
-                    --max-tokens \
-                    --hints "$hints"
-            else
-                python src/layton_eval/benchmark/generate_raw_file.py \
-                    --split "$split" \
-                    --hints "$hints"
-            fi
-        done
-    done
-done
+python src/layton_eval/benchmark/generate_raw_file.py --grid "$@"
+if [ $? -ne 0 ]; then
+    echo "Error generating batch input files"
+    exit 1
+fi
 
 echo "All batch input files generated!"
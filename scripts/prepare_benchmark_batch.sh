@@ -10,6 +10,9 @@ provider=""
 model=""
 thinking_level=""
 thinking_budget=""
+max_side=""
+jpeg_quality=""
+grayscale=""
 
 while [[ $# -gt 0 ]]; do
     case $1 in
@@ -41,9 +44,21 @@ while [[ $# -gt 0 ]]; do
             thinking_budget="$2"
             shift 2
             ;;
+        --max-side)
+            max_side="$2"
+            shift 2
+            ;;
+        --jpeg-quality)
+            jpeg_quality="$2"
+            shift 2
+            ;;
+        --grayscale)
+            grayscale="1"
+            shift
+            ;;
         *)
             echo "Error: Unknown option $1"
-            echo "Usage: $0 --split <vlm|llm> --hints <int> --provider <provider> --model <model> [--max-tokens <int>] [--thinking-level <level>] [--thinking-budget <budget>]"
+            echo "Usage: $0 --split <vlm|llm> --hints <int> --provider <provider> --model <model> [--max-tokens <int>] [--thinking-level <level>] [--thinking-budget <budget>] [--max-side <pixels>] [--jpeg-quality <int>] [--grayscale]"
             exit 1
             ;;
     esac
@@ -69,8 +84,20 @@ fi
 
 echo "Generating raw file..."
 
+# Image preprocessing arguments, shared by both scripts to find the same raw file
+image_args=""
+if [ -n "$max_side" ]; then
+    image_args="$image_args --max-side $max_side"
+fi
+if [ -n "$jpeg_quality" ]; then
+    image_args="$image_args --jpeg-quality $jpeg_quality"
+fi
+if [ -n "$grayscale" ]; then
+    image_args="$image_args --grayscale"
+fi
+
 # Prepare arguments for generate_raw_file.sh
-generate_args="--split $split --hints $hints"
+generate_args="--split $split --hints $hints$image_args"
 if [ -n "$max_tokens" ]; then
     generate_args="$generate_args --max-tokens $max_tokens"
 fi
@@ -85,7 +112,7 @@ fi
 echo "Creating batch..."
 
 # Prepare arguments for create_batch.sh
-create_args="--provider $provider --model $model --split $split --hints $hints"
+create_args="--provider $provider --model $model --split $split --hints $hints$image_args"
 if [ -n "$max_tokens" ]; then
     create_args="$create_args --max-tokens $max_tokens"
 fi
@@ -65,12 +65,12 @@ fi
 
 # Derive the raw file path from results file path
 # The Python script replaces "benchmark_" with "judge_" and outputs to raw_files/
-results_filename=$(basename "$results_file_path")
+results_filename=$(basename "${results_file_path%.zst}")
 raw_filename="${results_filename/benchmark_/judge_}"
 raw_file_path="raw_files/${raw_filename}"
 
-# Check if raw file was generated
-if [ ! -f "$raw_file_path" ]; then
+# Check if raw file was generated (compressed with RAW_FILE_FORMAT=jsonl.zst)
+if [ ! -f "$raw_file_path" ] && [ ! -f "$raw_file_path.zst" ]; then
     echo "Error: Expected raw file not found: $raw_file_path"
     exit 1
 fi
@@ -1,86 +1,159 @@
 import argparse
-import json
+import itertools
 import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 import polars as pl
 
+from layton_eval.dataset_cache import scan_layton_eval
+from layton_eval.image_store import (
+    add_preprocessing_arguments,
+    get_preprocessing_tag,
+    store_images,
+)
+from layton_eval.raw_requests import (
+    HINT_FIELDS,
+    get_system_prompt,
+    get_total_chars,
+    raw_request,
+    riddle_parts,
+    with_riddle_parts,
+    write_raw_requests,
+)
 from layton_eval.settings import settings
 from layton_eval.utils import load_txt
 
 
-def generate_raw_file(
-    split: t.Literal["vlm", "llm"], max_tokens: int | None = None, hints: int = 0
-):
-    df = pl.read_ndjson(
-        f"hf://datasets/rvienne/layton-eval/layton_eval_{split}.jsonl", infer_schema_length=100000
-    )
+def load_riddles(
+    split: t.Literal["vlm", "llm"],
+    max_side: int | None = None,
+    quality: int | None = None,
+    grayscale: bool = False,
+    workers: int | None = None,
+) -> tuple[pl.DataFrame, str]:
+    """Riddles of `split`, with images moved to the image store, and the image settings tag."""
+    # Images are only decoded for the VLM split, the only one sending them.
+    df = scan_layton_eval(split).select(pl.all() if split == "vlm" else pl.exclude("img")).collect()
+    if split != "vlm":
+        return df, ""
+    df = store_images(df, max_side, quality, grayscale, workers)
+    return df, get_preprocessing_tag(max_side, quality, grayscale)
+
+
+def get_riddle_parts(df: pl.DataFrame) -> pl.DataFrame:
+    """Parts of the requests shared by every hints level, encoded once per riddle."""
     image_prompt = load_txt(settings.root_dir / "prompts" / "benchmark" / "visual_riddle.txt")
     text_prompt = load_txt(settings.root_dir / "prompts" / "benchmark" / "text_riddle.txt")
+    return with_riddle_parts(df).with_columns(
+        get_system_prompt(image_prompt, text_prompt).alias("system_prompt")
+    )
+
+
+def get_raw_file_path(
+    split: str, hints: int, max_tokens: int | None = None, image_tag: str = ""
+) -> Path:
     file_name = f"benchmark_{split}_hints_{hints}"
     if max_tokens:
         file_name += f"_max_tokens_{max_tokens}"
-    file_name += ".jsonl"
-    file_path = settings.root_dir / "raw_files" / file_name
-    total_chars = 0
-
-    with open(file_path, "w") as f:
-        for row in df.iter_rows(named=True):
-            raw_request = {
-                "id": row.get("id"),
-                "system_prompt": "",
-                "messages": [],
-            }
-            if max_tokens:
-                raw_request["max_tokens"] = max_tokens
-            total_chars += len(row.get("description"))
-            content = [
-                {"type": "text", "text": f"Riddle question: {row.get('description')}"},
+    if image_tag:
+        file_name += f"_{image_tag}"
+    return settings.root_dir / "raw_files" / f"{file_name}.jsonl"
+
+
+def write_raw_file(
+    parts: pl.DataFrame, file_path: Path, hints: int, max_tokens: int | None = None
+) -> int:
+    """Write the requests of one (hints, max_tokens) variant, and return their characters."""
+    lines = parts.select(
+        raw_request(
+            pl.col("system_prompt"),
+            riddle_parts(hints),
+            request_id=pl.col("id"),
+            max_tokens=max_tokens,
+        )
+    ).to_series()
+    write_raw_requests(lines, file_path)
+    return parts.select(get_total_chars("description", *HINT_FIELDS[:hints])).item()
+
+
+def generate_raw_file(
+    split: t.Literal["vlm", "llm"],
+    max_tokens: int | None = None,
+    hints: int = 0,
+    max_side: int | None = None,
+    quality: int | None = None,
+    grayscale: bool = False,
+    workers: int | None = None,
+):
+    df, image_tag = load_riddles(split, max_side, quality, grayscale, workers)
+    file_path = get_raw_file_path(split, hints, max_tokens, image_tag)
+    total_chars = write_raw_file(get_riddle_parts(df), file_path, hints, max_tokens)
+    print(f"Total characters: {total_chars}")
+
+
+def generate_raw_files_grid(
+    splits: t.Sequence[t.Literal["vlm", "llm"]] = ("vlm", "llm"),
+    max_tokens: int | None = None,
+    hints_levels: t.Sequence[int] = (0, 1, 2, 3, 4),
+    max_side: int | None = None,
+    quality: int | None = None,
+    grayscale: bool = False,
+    workers: int | None = None,
+):
+    """Every (split, hints, max_tokens) raw file, with and without `max_tokens` when given.
+
+    Each split is loaded once and the requests of all its variants are built from the same
+    riddle parts. Files are written by `workers` threads, polars releases the GIL.
+    """
+    max_tokens_values = (None, max_tokens) if max_tokens else (None,)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for split in splits:
+            df, image_tag = load_riddles(split, max_side, quality, grayscale, workers)
+            parts = get_riddle_parts(df)
+            variants = list(itertools.product(hints_levels, max_tokens_values))
+            file_paths = [
+                get_raw_file_path(split, hints, variant_max_tokens, image_tag)
+                for hints, variant_max_tokens in variants
             ]
-            if row.get("split") == "vlm":
-                content.append(
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{row.get('img')}"},
-                    },
-                )
-            if hints >= 1 and row.get("first_hint"):
-                content.append(
-                    {"type": "text", "text": f"First hint: {row.get('first_hint')}"},
-                )
-                total_chars += len(row.get("first_hint"))
-            if hints >= 2 and row.get("second_hint"):
-                content.append(
-                    {"type": "text", "text": f"Second hint: {row.get('second_hint')}"},
-                )
-                total_chars += len(row.get("second_hint"))
-            if hints >= 3 and row.get("third_hint"):
-                content.append(
-                    {"type": "text", "text": f"Third hint: {row.get('third_hint')}"},
-                )
-                total_chars += len(row.get("third_hint"))
-            if hints >= 4 and row.get("special_hint"):
-                content.append(
-                    {"type": "text", "text": f"Special hint: {row.get('special_hint')}"},
-                )
-                total_chars += len(row.get("special_hint"))
-            raw_request["system_prompt"] = (
-                image_prompt if row.get("split") == "vlm" else text_prompt
-            )
-            raw_request["messages"] = [
-                {
-                    "role": "user",
-                    "content": content,
-                }
+            futures = [
+                executor.submit(write_raw_file, parts, file_path, hints, variant_max_tokens)
+                for file_path, (hints, variant_max_tokens) in zip(file_paths, variants)
             ]
-            json.dump(raw_request, f)
-            f.write("\n")
-    print(f"Total characters: {total_chars}")
+            for file_path, future in zip(file_paths, futures):
+                print(f"{file_path.name}: {future.result()} characters")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--max-tokens", type=int, help="Max tokens for the response")
-    parser.add_argument("--split", type=str, required=True)
+    parser.add_argument("--split", type=str, choices=["vlm", "llm"])
     parser.add_argument("--hints", type=int, default=0)
+    parser.add_argument(
+        "--grid",
+        action="store_true",
+        help="Generate every split and hints level, with and without --max-tokens if given",
+    )
+    add_preprocessing_arguments(parser)
     args = parser.parse_args()
-    generate_raw_file(split=args.split, max_tokens=args.max_tokens, hints=args.hints)
+    if args.grid:
+        generate_raw_files_grid(
+            splits=[args.split] if args.split else ["vlm", "llm"],
+            max_tokens=args.max_tokens,
+            max_side=args.max_side,
+            quality=args.jpeg_quality,
+            grayscale=args.grayscale,
+            workers=args.workers,
+        )
+    elif args.split is None:
+        parser.error("--split is required without --grid")
+    else:
+        generate_raw_file(
+            split=args.split,
+            max_tokens=args.max_tokens,
+            hints=args.hints,
+            max_side=args.max_side,
+            quality=args.jpeg_quality,
+            grayscale=args.grayscale,
+            workers=args.workers,
+        )
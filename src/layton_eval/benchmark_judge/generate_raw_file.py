@@ -1,129 +1,350 @@
 import argparse
 import json
 import typing as t
+from pathlib import Path
 
 import polars as pl
 from json_repair import repair_json
 
+from layton_eval.dataset_cache import scan_layton_eval
+from layton_eval.image_store import (
+    add_preprocessing_arguments,
+    get_image_data_url_chars,
+    store_images,
+)
+from layton_eval.judgement_cache import (
+    filter_cache_misses,
+    get_input_hash,
+    normalize_text,
+    write_judgement_keys,
+)
+from layton_eval.jury import get_jury_judges
+from layton_eval.raw_requests import (
+    HINT_FIELDS,
+    get_system_prompt,
+    get_total_chars,
+    raw_request,
+    riddle_parts,
+    text_part,
+    with_riddle_parts,
+    write_raw_requests,
+)
+from layton_eval.schemas import get_schema
 from layton_eval.settings import settings
+from layton_eval.storage import get_table_stem, read_table
 from layton_eval.utils import load_txt
 
+PARTICIPANT_ANSWER_DTYPE = pl.Struct({"answer": pl.String, "justification": pl.String})
+# `per-file` writes one raw file per results file, `grouped` one raw file for all of them.
+JudgeLayout = t.Literal["per-file", "grouped"]
+# Ids of grouped requests are `{judge file name}{separator}{riddle id}`.
+GROUPED_ID_SEPARATOR = "::"
 
-def generate_raw_file(
-    split: t.Literal["vlm", "llm"], max_tokens: bool = False, results_file_path: str = None
-):
-    df = pl.read_ndjson(f"hf://datasets/rvienne/layton-eval/layton_eval_{split}.jsonl")
-    file_name = results_file_path.split("/")[-1].replace("benchmark_", "judge_")
-    image_prompt = load_txt(settings.root_dir / "prompts" / "benchmark_judge" / "visual_riddle.txt")
-    text_prompt = load_txt(settings.root_dir / "prompts" / "benchmark_judge" / "text_riddle.txt")
+
+def parse_participant_answer(answer: str) -> dict[str, str]:
+    """Answer and justification of a model output, repaired if it is not valid JSON."""
+    try:
+        answer_dict = json.loads(answer)
+    except json.JSONDecodeError:
+        answer_dict = json.loads(repair_json(answer))
+    if not isinstance(answer_dict, dict):
+        answer_dict = {}
+    # A JSON null is no answer, not the text "None".
+    return {
+        key: "" if answer_dict.get(key) is None else str(answer_dict[key])
+        for key in ("answer", "justification")
+    }
+
+
+def get_judge_file_name(results_file_path: str | Path, max_tokens: bool = False) -> str:
+    """Name (without format suffix) of the raw judge file of a results file."""
+    file_name = get_table_stem(results_file_path).name.replace("benchmark_", "judge_")
     if max_tokens:
-        file_name = file_name.replace(".jsonl", "")
         file_name += "_max_tokens"
-        file_name += ".jsonl"
-    file_path = settings.root_dir / "raw_files" / file_name
-    total_chars = 0
-    df_results = pl.read_ndjson(results_file_path).select("custom_id", "answer")
-    joined_df = df.join(df_results, left_on="id", right_on="custom_id", suffix="_results")
-    with open(file_path, "w") as f:
-        for row in joined_df.iter_rows(named=True):
-            raw_request = {
-                "id": row.get("id"),
-                "system_prompt": "",
-                "messages": [],
-            }
-            if max_tokens:
-                raw_request["max_tokens"] = 64000
-            total_chars += len(row.get("description"))
-            content = [
-                {"type": "text", "text": f"Riddle question: {row.get('description')}"},
-            ]
-            if row.get("split") == "vlm":
-                content.append(
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{row.get('img')}"},
-                    },
-                )
-            if row.get("first_hint"):
-                content.append(
-                    {"type": "text", "text": f"First hint: {row.get('first_hint')}"},
-                )
-                total_chars += len(row.get("first_hint"))
-            if row.get("second_hint"):
-                content.append(
-                    {"type": "text", "text": f"Second hint: {row.get('second_hint')}"},
-                )
-                total_chars += len(row.get("second_hint"))
-            if row.get("third_hint"):
-                content.append(
-                    {"type": "text", "text": f"Third hint: {row.get('third_hint')}"},
-                )
-                total_chars += len(row.get("third_hint"))
-            if row.get("special_hint"):
-                content.append(
-                    {"type": "text", "text": f"Special hint: {row.get('special_hint')}"},
-                )
-                total_chars += len(row.get("special_hint"))
-            raw_request["system_prompt"] = (
-                image_prompt if row.get("split") == "vlm" else text_prompt
-            )
-            total_chars += len(text_prompt) if row.get("split") == "llm" else len(image_prompt)
-            content.extend(
-                [
-                    {"type": "text", "text": f"Riddle answer: {row.get('answer')}"},
-                    {"type": "text", "text": f"Riddle solution: {row.get('solution')}"},
-                ]
-            )
-            total_chars += len(row.get("answer"))
-            if row.get("solution"):
-                total_chars += len(row.get("solution"))
-            content.append(
-                {
-                    "type": "text",
-                    "text": f"Suggested justification: {row.get('justification')}",
-                }
-            )
-            total_chars += len(row.get("justification"))
-            try:
-                answer_dict = json.loads(row.get("answer_results"))
-            except json.JSONDecodeError:
-                answer_dict = json.loads(repair_json(row.get("answer_results")))
-            if isinstance(answer_dict, list):
-                answer_dict = {
-                    "answer": "",
-                    "justification": "",
-                }
-            content.append(
-                {
-                    "type": "text",
-                    "text": f"Participant answer: {answer_dict.get('answer', '')}",
-                }
-            )
-            total_chars += len(answer_dict.get("answer", ""))
-            content.append(
-                {
-                    "type": "text",
-                    "text": f"Participant justification: {answer_dict.get('justification', '')}",
-                }
-            )
-            total_chars += len(answer_dict.get("justification", ""))
-            raw_request["messages"] = [
-                {
-                    "role": "user",
-                    "content": content,
-                }
-            ]
-            json.dump(raw_request, f)
-            f.write("\n")
-    print(f"Total characters: {total_chars}")
+    return file_name
+
+
+def get_grouped_file_name(
+    results_file_paths: t.Sequence[str | Path],
+    split: str,
+    max_tokens: bool = False,
+    output_name: str | None = None,
+) -> str:
+    """Name of the raw judge file grouping several results files, all of the same provider.
+
+    It starts with `judge_{provider}_`, which the jury reads to leave out the judge of that
+    provider: results files of several providers cannot be grouped, and an `output_name` must
+    keep this prefix.
+    """
+    providers = {get_table_stem(path).name.split("_")[1] for path in results_file_paths}
+    if len(providers) != 1:
+        raise ValueError(
+            f"Grouped results files must share their provider, got {', '.join(sorted(providers))}"
+        )
+    prefix = f"judge_{providers.pop()}_"
+    if output_name is not None:
+        if not output_name.startswith(prefix):
+            raise ValueError(f"Name of the grouped raw file must start with {prefix!r}")
+        return output_name
+    file_name = f"{prefix}grouped_{split}"
+    if max_tokens:
+        file_name += "_max_tokens"
+    return file_name
+
+
+def load_judge_context(
+    split: t.Literal["vlm", "llm"],
+    max_side: int | None = None,
+    quality: int | None = None,
+    grayscale: bool = False,
+    workers: int | None = None,
+) -> pl.DataFrame:
+    """Riddles of `split` with the prefix shared by all the judge requests of each riddle.
+
+    The system prompt, riddle and reference parts are encoded once per riddle into `context`,
+    so that this prefix is byte-identical whichever model is judged. `image_chars` is what
+    inlining the image adds to the exported request.
+    """
+    # Images are only decoded for the VLM split, the only one sending them.
+    df = scan_layton_eval(split).select(pl.all() if split == "vlm" else pl.exclude("img")).collect()
+    if split == "vlm":
+        df = store_images(df, max_side, quality, grayscale, workers)
+        image_chars = pl.col("img").map_elements(
+            lambda ref: get_image_data_url_chars(ref) - len(ref), return_dtype=pl.Int64
+        )
+    else:
+        image_chars = pl.lit(0)
+    image_prompt = load_txt(settings.root_dir / "prompts" / "benchmark_judge" / "visual_riddle.txt")
+    text_prompt = load_txt(settings.root_dir / "prompts" / "benchmark_judge" / "text_riddle.txt")
+    context_parts = [
+        *riddle_parts(),
+        text_part(pl.format("Riddle answer: {}", pl.col("answer").fill_null("None"))),
+        text_part(pl.format("Riddle solution: {}", pl.col("solution").fill_null("None"))),
+        text_part(
+            pl.format("Suggested justification: {}", pl.col("justification").fill_null("None"))
+        ),
+    ]
+    return (
+        with_riddle_parts(df)
+        .with_row_index("riddle_index")
+        .with_columns(
+            get_system_prompt(image_prompt, text_prompt).alias("system_prompt"),
+            pl.when(pl.col("split") == "vlm")
+            .then(len(image_prompt))
+            .otherwise(len(text_prompt))
+            .alias("system_prompt_chars"),
+            pl.concat_list(context_parts).list.drop_nulls().list.join(", ").alias("context"),
+            image_chars.fill_null(0).alias("image_chars"),
+        )
+        # Changes of the prompts or of the riddle change the input of every judge request.
+        .with_columns(
+            get_input_hash(pl.col("system_prompt"), pl.col("context")).alias("context_hash")
+        )
+    )
+
+
+def load_participant_answers(results_file_path: str | Path) -> pl.DataFrame:
+    """Parsed answers of a results file, without the errored requests, which have none.
+
+    Errored requests are left to `reconcile_results`, to be retried.
+    """
+    df = read_table(results_file_path, schema=get_schema("batch_result"))
+    is_errored = pl.col("answer").is_null() | (pl.col("answer").str.strip_chars() == "")
+    n_errored = df.select(is_errored.sum()).item()
+    if n_errored:
+        print(f"{results_file_path}: {n_errored} errored requests without answer, not judged")
+    return df.filter(~is_errored).select(
+        "custom_id",
+        pl.col("answer")
+        .map_elements(parse_participant_answer, return_dtype=PARTICIPANT_ANSWER_DTYPE)
+        .struct.rename_fields(["participant_answer", "participant_justification"])
+        .struct.unnest(),
+    )
+
+
+def get_judge_requests(
+    context: pl.DataFrame, results_file_path: str | Path, request_id: pl.Expr
+) -> pl.DataFrame:
+    """Judge requests on the answers of a results file, one per riddle it answers.
+
+    `input_hash` identifies what the judge is given, whitespace aside, see `judgement_cache`.
+    """
+    df = context.join(
+        load_participant_answers(results_file_path),
+        left_on="id",
+        right_on="custom_id",
+        how="inner",
+        maintain_order="left",
+    )
+    return df.with_columns(
+        request_id.alias("request_id"),
+        get_input_hash(
+            pl.col("context_hash"),
+            normalize_text(pl.col("participant_answer")),
+            normalize_text(pl.col("participant_justification")),
+        ).alias("input_hash"),
+    )
+
+
+def with_judge_lines(df: pl.DataFrame, max_tokens: bool = False) -> pl.DataFrame:
+    """Add the JSON `line` of each judge request, the participant answer coming last."""
+    return df.with_columns(
+        raw_request(
+            pl.col("system_prompt"),
+            [
+                pl.col("context"),
+                text_part(pl.format("Participant answer: {}", pl.col("participant_answer"))),
+                text_part(
+                    pl.format("Participant justification: {}", pl.col("participant_justification"))
+                ),
+            ],
+            request_id=pl.col("request_id"),
+            max_tokens=64000 if max_tokens else None,
+        ).alias("line")
+    )
+
+
+def get_total_judge_chars(df: pl.DataFrame) -> int:
+    """Characters of the prompts, riddles, references and participant answers of `df`."""
+    return df.select(
+        get_total_chars(
+            "description",
+            *HINT_FIELDS,
+            "answer",
+            "solution",
+            "justification",
+            "participant_answer",
+            "participant_justification",
+        )
+        + pl.col("system_prompt_chars").sum()
+    ).item()
+
+
+def print_prefix_cache_report(df: pl.DataFrame):
+    """Estimated share of the exported characters providers can serve from their prompt cache.
+
+    Every request on a riddle but the first can reuse the cached system prompt and context.
+    """
+    if df.is_empty():
+        return
+    prefix_chars = (
+        pl.col("system_prompt").str.len_chars()
+        + pl.col("context").str.len_chars()
+        + pl.col("image_chars")
+    )
+    report = (
+        df.group_by("riddle_index")
+        .agg(
+            ((pl.len() - 1) * prefix_chars.first()).alias("cacheable_chars"),
+            (pl.col("line").str.len_chars() + pl.col("image_chars")).sum().alias("total_chars"),
+        )
+        .select(pl.len().alias("riddles"), pl.col("cacheable_chars", "total_chars").sum())
+        .row(0, named=True)
+    )
+    print(
+        f"Cacheable prefix: {report['cacheable_chars'] / report['total_chars']:.1%} of "
+        f"{report['total_chars']:,} exported characters ({len(df)} requests on "
+        f"{report['riddles']} riddles)"
+    )
+
+
+def write_judge_raw_file(df: pl.DataFrame, file_name: str, use_cache: bool = True):
+    """Write the requests of `df` under `raw_files/{file_name}`, without the cached ones."""
+    if use_cache:
+        judged = len(df)
+        df = filter_cache_misses(df, get_jury_judges(file_name))
+        print(f"{judged - len(df)} of {judged} requests already judged by the jury, skipped")
+    raw_file_path = write_raw_requests(
+        df["line"], settings.root_dir / "raw_files" / f"{file_name}.jsonl"
+    )
+    print(f"Raw file: {raw_file_path}")
+    print(f"Total characters: {get_total_judge_chars(df)}")
+    print_prefix_cache_report(df)
+
+
+def generate_raw_file(
+    split: t.Literal["vlm", "llm"],
+    max_tokens: bool = False,
+    results_file_paths: str | t.Sequence[str] = (),
+    layout: JudgeLayout = "per-file",
+    output_name: str | None = None,
+    use_cache: bool = True,
+    max_side: int | None = None,
+    quality: int | None = None,
+    grayscale: bool = False,
+    workers: int | None = None,
+):
+    """Judge requests on the predictions of one or more results files.
+
+    With the `grouped` layout, the requests of all results files go to a single raw file,
+    ordered by riddle so that the requests sharing a prefix are sent one after the other. Their
+    results are split back per results file with `split_grouped_results.py`.
+
+    With `use_cache`, requests every judge of the jury already answered (see
+    `layton_eval.judgement_cache`) are left out, `compute_jury_results` reads their verdicts
+    from the cache.
+    """
+    if isinstance(results_file_paths, str):
+        results_file_paths = [results_file_paths]
+    if layout == "grouped":
+        output_name = get_grouped_file_name(results_file_paths, split, max_tokens, output_name)
+    context = load_judge_context(split, max_side, quality, grayscale, workers)
+    requests = {}
+    for results_file_path in results_file_paths:
+        file_name = get_judge_file_name(results_file_path, max_tokens)
+        request_id = (
+            pl.col("id")
+            if layout == "per-file"
+            else pl.format(f"{file_name}{GROUPED_ID_SEPARATOR}{{}}", pl.col("id"))
+        )
+        df = get_judge_requests(context, results_file_path, request_id)
+        if use_cache:
+            write_judgement_keys(df.rename({"id": "custom_id"}), file_name)
+        requests[file_name] = with_judge_lines(df, max_tokens)
+    if layout == "per-file":
+        for file_name, df in requests.items():
+            write_judge_raw_file(df, file_name, use_cache)
+    else:
+        write_judge_raw_file(
+            pl.concat(requests.values()).sort("riddle_index", maintain_order=True),
+            output_name,
+            use_cache,
+        )
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--max-tokens", action="store_true")
     parser.add_argument("--split", type=str, required=True)
-    parser.add_argument("--results-file-path", type=str, required=True)
+    parser.add_argument("--results-file-path", type=str, nargs="+", required=True)
+    parser.add_argument(
+        "--layout",
+        type=str,
+        choices=t.get_args(JudgeLayout),
+        default="per-file",
+        help="`grouped`: one raw file for all results files, requests ordered by riddle",
+    )
+    parser.add_argument(
+        "--output-name",
+        type=str,
+        help="Name of the grouped raw file, starting with judge_{provider}_",
+    )
+    parser.add_argument(
+        "--no-judgement-cache",
+        action="store_true",
+        help="Send every request, even those the jury already judged",
+    )
+    add_preprocessing_arguments(parser)
     args = parser.parse_args()
     generate_raw_file(
-        split=args.split, max_tokens=args.max_tokens, results_file_path=args.results_file_path
+        split=args.split,
+        max_tokens=args.max_tokens,
+        results_file_paths=args.results_file_path,
+        layout=args.layout,
+        output_name=args.output_name,
+        use_cache=not args.no_judgement_cache,
+        max_side=args.max_side,
+        quality=args.jpeg_quality,
+        grayscale=args.grayscale,
+        workers=args.workers,
     )
@@ -0,0 +1,44 @@
+import argparse
+from pathlib import Path
+
+import polars as pl
+
+from layton_eval.benchmark_judge.generate_raw_file import GROUPED_ID_SEPARATOR
+from layton_eval.storage import get_table_stem, read_table, resolve_table, write_table
+
+
+def split_grouped_results(results_file_path: str | Path) -> list[Path]:
+    """Split the results of a judge on a grouped raw file into one results file per judge file.
+
+    `{grouped name}_by_{judge}` gives `{judge file name}_by_{judge}` files next to it, keyed by
+    riddle id, as if each judge file had been sent in its own batch.
+    """
+    path = resolve_table(results_file_path)
+    stem = get_table_stem(path)
+    table_format = path.name.removeprefix(f"{stem.name}.")
+    judge = stem.name.rsplit("_by_", 1)[1]
+    df = read_table(path).with_columns(
+        pl.col("custom_id")
+        .str.split_exact(GROUPED_ID_SEPARATOR, 1)
+        .struct.rename_fields(["judge_file_name", "custom_id"])
+        .struct.unnest()
+    )
+    return [
+        write_table(
+            group.drop("judge_file_name"),
+            stem.with_name(f"{judge_file_name}_by_{judge}"),
+            table_format,
+        )
+        for (judge_file_name,), group in df.partition_by(
+            "judge_file_name", as_dict=True, maintain_order=True
+        ).items()
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results-file-path", type=str, nargs="+", required=True)
+    args = parser.parse_args()
+    for results_file_path in args.results_file_path:
+        for path in split_grouped_results(results_file_path):
+            print(path)
@@ -0,0 +1,271 @@
+import hashlib
+import typing as t
+from statistics import NormalDist
+
+import numpy as np
+
+BootstrapMode = t.Literal["indices", "counts"]
+Method = t.Literal["bootstrap", "analytic"]
+
+
+def get_judge_field_name(field_name: str) -> str:
+    return field_name.replace("is_", "") + "ness"
+
+
+def get_human_field_name(field_name: str) -> str:
+    return "human_" + field_name.replace("is_", "")
+
+
+def get_seed_sequence(seed: int, *keys: str) -> np.random.SeedSequence:
+    """Seed stream identified by `keys` (e.g. provider and model) under the root `seed`.
+
+    The stream only depends on the keys themselves, not on how many other streams were drawn
+    before it, so results do not change with scheduling order or the number of workers.
+    """
+    spawn_key = tuple(
+        int.from_bytes(hashlib.sha256(key.encode()).digest()[:4], "little") for key in keys
+    )
+    return np.random.SeedSequence(seed, spawn_key=spawn_key)
+
+
+def ppi_mean_pointestimates(
+    Y: np.ndarray, Y_hat: np.ndarray, Y_hat_unlabelled: np.ndarray
+) -> np.ndarray:
+    """Power-tuned PPI mean point estimate for every row of `Y` / `Y_hat`.
+
+    Closed form of `ppi_py.ppi_mean_pointestimate` (with `lam=None`) for a scalar mean,
+    evaluated for all bootstrap replicates at once. `Y` and `Y_hat` have shape
+    `(n_boot, n)` and `Y_hat_unlabelled` has shape `(N,)`.
+    """
+    n = Y.shape[1]
+    N = Y_hat_unlabelled.shape[0]
+    Y_mean = Y.mean(axis=1)
+    Y_hat_mean = Y_hat.mean(axis=1)
+    Y_hat_unlabelled_mean = Y_hat_unlabelled.mean()
+    cov_grads = 2 * ((Y - Y_mean[:, None]) * (Y_hat - Y_hat_mean[:, None])).mean(axis=1)
+    pooled_mean = (n * Y_hat_mean + N * Y_hat_unlabelled_mean) / (n + N)
+    var_grads_hat = (
+        ((Y_hat - pooled_mean[:, None]) ** 2).sum(axis=1)
+        + ((Y_hat_unlabelled[None, :] - pooled_mean[:, None]) ** 2).sum(axis=1)
+    ) / (n + N - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lam = np.clip(cov_grads / (2 * (1 + n / N) * var_grads_hat), 0, 1)
+    return lam * Y_hat_unlabelled_mean + Y_mean - lam * Y_hat_mean
+
+
+class StratifiedBootstrap:
+    """Bootstrap of the PPI mean where the labelled sample mirrors the model's jury distribution.
+
+    Every replicate draws, for each unlabelled prediction, one labelled row (with replacement)
+    sharing its jury value. The labelled pool is sorted by jury value once, so a replicate is
+    a `(n_boot, N)` matrix of positions inside each prediction's jury bin.
+
+    Since human labels are boolean and jury values discrete, a replicate is also fully described
+    by how many positive labels were drawn in each jury bin: the `"counts"` mode samples those
+    binomial counts directly, at O(n_bins) per replicate instead of O(N).
+    """
+
+    def __init__(self, Y: np.ndarray, Y_hat: np.ndarray, Y_hat_unlabelled: np.ndarray):
+        order = np.argsort(Y_hat, kind="stable")
+        self.Y = Y[order]
+        self.Y_hat = Y_hat[order]
+        self.Y_hat_unlabelled = Y_hat_unlabelled
+        self.bin_values, bin_index, self.bin_counts = np.unique(
+            Y_hat_unlabelled, return_inverse=True, return_counts=True
+        )
+        bin_offsets = np.searchsorted(self.Y_hat, self.bin_values, side="left")
+        bin_sizes = np.searchsorted(self.Y_hat, self.bin_values, side="right") - bin_offsets
+        if (bin_sizes == 0).any():
+            missing = self.bin_values[bin_sizes == 0]
+            raise ValueError(f"No labelled rows with jury value(s) {missing.tolist()}")
+        self.offsets = bin_offsets[bin_index]
+        self.sizes = bin_sizes[bin_index]
+        cumulative_Y = np.concatenate([[0.0], np.cumsum(self.Y)])
+        self.bin_positive_rates = (
+            cumulative_Y[bin_offsets + bin_sizes] - cumulative_Y[bin_offsets]
+        ) / bin_sizes
+        cumulative_Y_squared = np.concatenate([[0.0], np.cumsum(self.Y**2)])
+        self.bin_variances = (
+            cumulative_Y_squared[bin_offsets + bin_sizes] - cumulative_Y_squared[bin_offsets]
+        ) / bin_sizes - self.bin_positive_rates**2
+
+    def sample_indices(self, uniforms: np.ndarray) -> np.ndarray:
+        """Map `(n_boot, N)` uniforms in [0, 1) to positions in the sorted labelled pool."""
+        return self.offsets + (uniforms * self.sizes).astype(np.int64)
+
+    def point_estimates_from_uniforms(self, uniforms: np.ndarray) -> np.ndarray:
+        Y = self.Y[self.sample_indices(uniforms)]
+        # Resampled jury values always equal the unlabelled ones, column by column.
+        Y_hat = np.broadcast_to(self.Y_hat_unlabelled, Y.shape)
+        return ppi_mean_pointestimates(Y, Y_hat, self.Y_hat_unlabelled)
+
+    def point_estimates_from_counts(self, positives: np.ndarray) -> np.ndarray:
+        """PPI estimates from `(n_boot, n_bins)` counts of drawn rows with a positive label."""
+        n = N = self.Y_hat_unlabelled.shape[0]
+        Y_mean = positives.sum(axis=1) / n
+        Y_hat_mean = self.Y_hat_unlabelled.mean()
+        cov_grads = 2 * (positives @ self.bin_values / n - Y_mean * Y_hat_mean)
+        var_grads_hat = np.concatenate([self.Y_hat_unlabelled, self.Y_hat_unlabelled]).var(ddof=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lam = np.clip(cov_grads / (2 * (1 + n / N) * var_grads_hat), 0, 1)
+        return lam * Y_hat_mean + Y_mean - lam * Y_hat_mean
+
+    def normal_approximation(self) -> tuple[float, float]:
+        """Mean and standard error of the replicates, in closed form.
+
+        Resampled jury values match the unlabelled ones, so the PPI correction cancels out and
+        a replicate is the mean of N labels drawn independently within their jury bin: a
+        stratified mean, whose distribution is asymptotically normal (CLT).
+        """
+        N = self.Y_hat_unlabelled.shape[0]
+        mean = self.bin_counts @ self.bin_positive_rates / N
+        standard_error = np.sqrt(self.bin_counts @ self.bin_variances) / N
+        return mean.item(), standard_error.item()
+
+    def point_estimates(
+        self,
+        rng: np.random.Generator,
+        n_boot: int = 10_000,
+        batch_size: int = 1_000,
+        mode: BootstrapMode = "indices",
+    ) -> np.ndarray:
+        """Draw `n_boot` replicates in batches of `batch_size` rows to bound memory."""
+        if mode == "indices":
+            return joint_point_estimates([self], rng, n_boot, batch_size)[0]
+        if not np.isin(self.Y, [0.0, 1.0]).all():
+            raise ValueError("The counts bootstrap mode requires boolean human labels")
+        point_estimates = np.empty(n_boot)
+        for start in range(0, n_boot, batch_size):
+            stop = min(start + batch_size, n_boot)
+            positives = rng.binomial(
+                self.bin_counts,
+                self.bin_positive_rates,
+                size=(stop - start, len(self.bin_counts)),
+            )
+            point_estimates[start:stop] = self.point_estimates_from_counts(positives)
+        return point_estimates
+
+
+def joint_point_estimates(
+    bootstraps: list[StratifiedBootstrap],
+    rng: np.random.Generator,
+    n_boot: int = 10_000,
+    batch_size: int = 1_000,
+) -> np.ndarray:
+    """Row-level replicates of several targets judged on the same predictions.
+
+    Every target reuses the uniform drawn for a given (replicate, prediction) cell and maps it
+    into its own jury bin, so each target keeps its exact bootstrap distribution while the
+    random draws are shared. Returns an array of shape `(len(bootstraps), n_boot)`.
+    """
+    N = bootstraps[0].Y_hat_unlabelled.shape[0]
+    point_estimates = np.empty((len(bootstraps), n_boot))
+    for start in range(0, n_boot, batch_size):
+        stop = min(start + batch_size, n_boot)
+        uniforms = rng.random((stop - start, N))
+        for i, bootstrap in enumerate(bootstraps):
+            point_estimates[i, start:stop] = bootstrap.point_estimates_from_uniforms(uniforms)
+    return point_estimates
+
+
+def round_score_and_ci(ppi_ci_lower: float, ppi_ci_upper: float) -> tuple[float, float]:
+    """Leaderboard score and rounded-up 95% CI half-width, in percentage points."""
+    score = (ppi_ci_upper + ppi_ci_lower) / 2
+    spread = (ppi_ci_upper - ppi_ci_lower) / 2
+    return np.round(score * 100, 1).item(), (np.floor(spread * 100 * 10) + 1).item() / 10
+
+
+def get_score_and_ci(point_estimates: np.ndarray) -> tuple[float, float]:
+    return round_score_and_ci(
+        np.percentile(point_estimates, 2.5), np.percentile(point_estimates, 97.5)
+    )
+
+
+def get_normal_score_and_ci(
+    mean: float, standard_error: float, confidence: float = 0.95
+) -> tuple[float, float]:
+    """Same as `get_score_and_ci`, from a normal approximation of the replicates."""
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    return round_score_and_ci(mean - z * standard_error, mean + z * standard_error)
+
+
+def is_converged(point_estimates: np.ndarray, confidence: float = 0.95) -> bool:
+    """Whether more replicates can no longer change the reported score and CI.
+
+    Each CI endpoint is bracketed by the distribution-free confidence interval of its
+    percentile (normal approximation of the order statistic rank). The replicates have
+    converged when the rounded score and CI are the same at both ends of those brackets.
+    """
+    n = point_estimates.shape[0]
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    brackets = []
+    for p in (0.025, 0.975):
+        margin = z * np.sqrt(p * (1 - p) / n)
+        brackets.append(
+            np.percentile(point_estimates, [100 * max(p - margin, 0), 100 * min(p + margin, 1)])
+        )
+    (lower_low, lower_high), (upper_low, upper_high) = brackets
+    # The score grows with both endpoints, the spread grows with the upper one only.
+    score_low, _ = round_score_and_ci(lower_low, upper_low)
+    score_high, _ = round_score_and_ci(lower_high, upper_high)
+    _, ci_low = round_score_and_ci(lower_high, upper_low)
+    _, ci_high = round_score_and_ci(lower_low, upper_high)
+    return score_low == score_high and ci_low == ci_high
+
+
+def adaptive_point_estimates(
+    draw: t.Callable[[int], np.ndarray],
+    chunk_size: int = 1_000,
+    max_boot: int = 100_000,
+    confidence: float = 0.95,
+) -> np.ndarray:
+    """Draw replicates chunk by chunk until every target has converged or `max_boot` is reached.
+
+    `draw(n)` must return `n` new replicates for each target, as an `(n_targets, n)` array.
+    """
+    chunks = []
+    n_boot = 0
+    while n_boot < max_boot:
+        chunks.append(draw(min(chunk_size, max_boot - n_boot)))
+        n_boot += chunks[-1].shape[1]
+        point_estimates = np.concatenate(chunks, axis=1)
+        if all(is_converged(target, confidence) for target in point_estimates):
+            break
+    return point_estimates
+
+
+def get_replicate_ranks(point_estimates: np.ndarray) -> np.ndarray:
+    """Rank (1 = best) of every model within every replicate of a `(n_boot, n_models)` matrix.
+
+    Tied models share the best of their ranks, as in the leaderboard.
+    """
+    n_boot, n_models = point_estimates.shape
+    order = np.argsort(-point_estimates, axis=1, kind="stable")
+    sorted_estimates = np.take_along_axis(point_estimates, order, axis=1)
+    positions = np.broadcast_to(np.arange(1, n_models + 1), (n_boot, n_models))
+    is_new_value = np.ones((n_boot, n_models), dtype=bool)
+    is_new_value[:, 1:] = sorted_estimates[:, 1:] != sorted_estimates[:, :-1]
+    sorted_ranks = np.maximum.accumulate(np.where(is_new_value, positions, 0), axis=1)
+    ranks = np.empty((n_boot, n_models), dtype=np.int64)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=1)
+    return ranks
+
+
+def get_rank_probabilities(ranks: np.ndarray) -> np.ndarray:
+    """`(n_models, n_models)` matrix of P(model i is ranked k + 1) from replicate ranks."""
+    n_boot, n_models = ranks.shape
+    cells = np.arange(n_models) * n_models + (ranks - 1)
+    return (
+        np.bincount(cells.ravel(), minlength=n_models * n_models).reshape(n_models, n_models)
+        / n_boot
+    )
+
+
+def get_win_probabilities(point_estimates: np.ndarray) -> np.ndarray:
+    """`(n_models, n_models)` matrix of P(model i scores strictly higher than model j)."""
+    n_models = point_estimates.shape[1]
+    win_probabilities = np.empty((n_models, n_models))
+    # One model at a time keeps memory at O(n_boot * n_models).
+    for i in range(n_models):
+        win_probabilities[i] = (point_estimates[:, [i]] > point_estimates).mean(axis=0)
+    return win_probabilities
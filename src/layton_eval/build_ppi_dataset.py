@@ -1,11 +1,13 @@
 import polars as pl
-import glob
+from layton_eval.schemas import decode_answer, get_schema
 from layton_eval.settings import settings
+from layton_eval.storage import TableFormat, find_tables, read_table, read_tables, write_table
 import argparse
+import typing as t
 
 def get_predictions_df(split: str):
-    return pl.read_ndjson(glob.glob(f"results/benchmark_*_{split}_*.jsonl"), include_file_paths="source_file")["custom_id", "answer", "source_file"].with_columns(
-        pl.col("answer").str.json_decode(dtype=pl.Struct(fields={"answer": pl.String, "justification": pl.String})).struct.unnest(),
+    return read_tables(find_tables(f"results/benchmark_*_{split}_*"), include_file_paths="source_file", schema=get_schema("batch_result"))["custom_id", "answer", "source_file"].with_columns(
+        decode_answer("benchmark_answer").struct.unnest(),
         (
             pl.col("source_file").str.split("_").list.get(2) +
             pl.when(pl.col("source_file").str.contains("thinking_32k")).then(pl.lit("_thinking_32k")).otherwise(pl.lit(""))).alias("model"),
@@ -16,8 +18,8 @@ def get_judges_results_df(judge_file_path: str):
     model_name = judge_file_path.split("/")[-1].split("_")[2]
     if "thinking_32k" in judge_file_path:
         model_name += "_thinking_32k"
-    return pl.read_ndjson(judge_file_path)["custom_id", "answer", "model"].with_columns(
-        pl.col("answer").str.json_decode(dtype=pl.Struct(fields={"is_answer_correct": pl.Boolean, "is_justification_correct": pl.Boolean})).struct.unnest()
+    return read_table(judge_file_path, columns=["custom_id", "answer", "model"], schema=get_schema("batch_result")).with_columns(
+        decode_answer("benchmark_judgement").struct.unnest()
     ).with_columns(
         pl.col("is_answer_correct").and_(pl.col("is_justification_correct")).alias("both_correct")
     ).insert_column(
@@ -26,13 +28,13 @@ def get_judges_results_df(judge_file_path: str):
     ).rename({"model": "judge_model", "custom_id": "riddle_id"}).drop("answer")
 
 def get_human_annotations_df(split: str):
-    return pl.read_ndjson(settings.root_dir / "annotations" / f"{split}.jsonl").rename({"is_answer_correct": "human_answer_correct", "is_justification_correct": "human_justification_correct"}).with_columns(
+    return read_table(settings.root_dir / "annotations" / f"{split}.jsonl", schema=get_schema("annotation")).rename({"is_answer_correct": "human_answer_correct", "is_justification_correct": "human_justification_correct"}).with_columns(
         (
             pl.col("source_file").str.split("_").list.get(2) +
             pl.when(pl.col("source_file").str.contains("thinking_32k")).then(pl.lit("_thinking_32k")).otherwise(pl.lit(""))).alias("model"),
     ).with_columns(pl.col("human_answer_correct").and_(pl.col("human_justification_correct")).alias("human_both_correct")).drop("notes", "custom_id", "source_file", "provider")
 
-def main(judge_file_paths: list[str]):
+def main(judge_file_paths: list[str], output_format: TableFormat = "jsonl"):
     df_judge = pl.concat([get_judges_results_df(judge_file_path) for judge_file_path in judge_file_paths]).pivot(
         on="judge_model",
         index=["riddle_id", "judged_model"],
@@ -79,10 +81,11 @@ def main(judge_file_paths: list[str]):
         "human_both_correct",
     ).with_columns(
         pl.col("model").replace(mapping).alias("model"),
-    ).insert_column(3, pl.lit(0).alias("n_hints")).write_ndjson(f"ppi_{split}.jsonl")
+    ).insert_column(3, pl.lit(0).alias("n_hints")).pipe(write_table, f"ppi_{split}", output_format)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--judge-file-paths", type=str, nargs="+", required=True, help="List of judge result files (supports shell wildcards like results/*.jsonl)")
+    parser.add_argument("--output-format", type=str, choices=t.get_args(TableFormat), default="jsonl")
     args = parser.parse_args()
-    main(judge_file_paths=args.judge_file_paths)
+    main(judge_file_paths=args.judge_file_paths, output_format=args.output_format)
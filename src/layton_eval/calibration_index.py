@@ -0,0 +1,77 @@
+import hashlib
+
+import numpy as np
+import polars as pl
+
+from layton_eval.bootstrap import get_human_field_name
+from layton_eval.settings import settings
+
+FIELD_NAMES = ("is_answer_correct", "is_justification_correct", "both_correct")
+# Pool used for providers that have no judged predictions in the PPI table (nothing to exclude).
+ALL_PROVIDERS = "*"
+
+
+def get_ppi_hash(df_ppi: pl.DataFrame) -> str:
+    """Content hash of the labelled rows, the only part of the PPI table the index depends on."""
+    df_labelled = df_ppi.filter(pl.col("human_answer_correct").is_not_null()).select(
+        "provider",
+        "model",
+        "n_hints",
+        "riddle_id",
+        pl.selectors.starts_with(*FIELD_NAMES),
+        pl.selectors.starts_with("human_"),
+    )
+    return hashlib.sha256(
+        df_labelled.sort("provider", "model", "n_hints", "riddle_id").write_csv().encode()
+    ).hexdigest()
+
+
+def build_calibration_index(df_ppi: pl.DataFrame) -> dict[str, np.ndarray]:
+    """Labelled pool of every excluded provider and field, sorted (grouped) by jury value.
+
+    Keys are `{provider}/{field_name}/Y` (human labels) and `{provider}/{field_name}/Y_hat`
+    (jury means). The `ALL_PROVIDERS` pool keeps every labelled row.
+    """
+    df_labelled = df_ppi.filter(pl.col("human_answer_correct").is_not_null()).sort(
+        "provider", "model", "n_hints", "riddle_id"
+    )
+    providers = df_ppi["provider"].unique().sort().to_list()
+    index = {}
+    for field_name in FIELD_NAMES:
+        Y = df_labelled[get_human_field_name(field_name)].to_numpy().astype(float)
+        Y_hat = (
+            df_labelled.select(pl.mean_horizontal(pl.selectors.starts_with(field_name)))
+            .to_series()
+            .to_numpy()
+            .astype(float)
+        )
+        labelled_providers = df_labelled["provider"].to_numpy().astype(str)
+        for provider in [ALL_PROVIDERS, *providers]:
+            is_pool = labelled_providers != provider
+            order = np.argsort(Y_hat[is_pool], kind="stable")
+            index[f"{provider}/{field_name}/Y"] = Y[is_pool][order]
+            index[f"{provider}/{field_name}/Y_hat"] = Y_hat[is_pool][order]
+    return index
+
+
+def load_calibration_index(df_ppi: pl.DataFrame, split: str) -> dict[str, np.ndarray]:
+    """Load the calibration index of `df_ppi` from disk, building it if annotations changed."""
+    index_path = (
+        settings.root_dir / "cache" / "calibration" / f"{split}_{get_ppi_hash(df_ppi)[:16]}.npz"
+    )
+    if index_path.exists():
+        with np.load(index_path) as index:
+            return dict(index)
+    index = build_calibration_index(df_ppi)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(index_path, **index)
+    return index
+
+
+def get_calibration_pool(
+    index: dict[str, np.ndarray], provider: str, field_name: str = "both_correct"
+) -> tuple[np.ndarray, np.ndarray]:
+    """Human labels and jury means of the labelled rows not predicted by `provider`."""
+    if f"{provider}/{field_name}/Y" not in index:
+        provider = ALL_PROVIDERS
+    return index[f"{provider}/{field_name}/Y"], index[f"{provider}/{field_name}/Y_hat"]
@@ -1,114 +1,453 @@
 import argparse
+import itertools
+import typing as t
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
 import numpy as np
 import polars as pl
-from ppi_py import ppi_mean_pointestimate
 from tqdm import tqdm
 
+from layton_eval.bootstrap import (
+    BootstrapMode,
+    Method,
+    StratifiedBootstrap,
+    adaptive_point_estimates,
+    get_normal_score_and_ci,
+    get_rank_probabilities,
+    get_replicate_ranks,
+    get_score_and_ci,
+    get_seed_sequence,
+    get_win_probabilities,
+    joint_point_estimates,
+)
+from layton_eval.calibration_index import (
+    FIELD_NAMES,
+    build_calibration_index,
+    get_calibration_pool,
+    load_calibration_index,
+)
+from layton_eval.dataset_cache import read_ppi
+from layton_eval.schemas import get_schema
+from layton_eval.score_cache import (
+    get_score_cache_path,
+    load_point_estimates,
+    save_point_estimates,
+)
+from layton_eval.settings import settings
+from layton_eval.storage import read_table
 
-def get_ppi_inputs(df_ppi: pl.DataFrame, provider: str, model: str, field_name="both_correct"):
-    judge_field_name = field_name.replace("is_", "") + "ness"
-    df_ppi = df_ppi.with_columns(
-        pl.mean_horizontal(pl.selectors.starts_with(field_name)).alias(judge_field_name)
-    )
-    df_labelled_unsampled = df_ppi.filter(
-        (pl.col("provider") != provider) & (pl.col("human_answer_correct").is_not_null())
+# Replicates are seeded by block, which is also the unit of sharding and of adaptive runs.
+REPLICATE_BLOCK_SIZE = 1_000
+
+
+def get_n_blocks(n_boot: int) -> int:
+    return -(-n_boot // REPLICATE_BLOCK_SIZE)
+
+
+def get_ppi_arrays(
+    df_ppi: pl.DataFrame, field_names: t.Sequence[str] = FIELD_NAMES
+) -> dict[str, np.ndarray]:
+    """Plain NumPy view of the jury values, cheap to hand over to worker processes.
+
+    Rows are sorted so that bootstrap draws do not depend on the row order of the input file.
+    """
+    df_ppi = df_ppi.sort("provider", "model", "n_hints", "riddle_id")
+    ppi_arrays = {
+        "model": df_ppi["model"].to_numpy().astype(str),
+        "n_hints": df_ppi["n_hints"].to_numpy(),
+    }
+    for field_name in field_names:
+        ppi_arrays[f"Y_hat/{field_name}"] = (
+            df_ppi.select(pl.mean_horizontal(pl.selectors.starts_with(field_name)))
+            .to_series()
+            .to_numpy()
+            .astype(float)
+        )
+    return ppi_arrays
+
+
+def get_ppi_inputs(
+    ppi_arrays: dict[str, np.ndarray],
+    calibration_index: dict[str, np.ndarray],
+    provider: str,
+    model: str,
+    n_hints: int = 0,
+    field_name="both_correct",
+):
+    Y, Y_hat = get_calibration_pool(calibration_index, provider, field_name)
+    is_unlabelled = (ppi_arrays["model"] == model) & (ppi_arrays["n_hints"] == n_hints)
+    Y_hat_unlabelled = ppi_arrays[f"Y_hat/{field_name}"][is_unlabelled]
+    return Y, Y_hat, Y_hat_unlabelled
+
+
+def get_point_estimates(
+    ppi_arrays: dict[str, np.ndarray],
+    calibration_index: dict[str, np.ndarray],
+    provider: str,
+    model: str,
+    n_hints: int = 0,
+    field_names: t.Sequence[str] = ("both_correct",),
+    seed: int = 0,
+    n_boot: int = 10_000,
+    bootstrap_mode: BootstrapMode = "indices",
+    adaptive: bool = False,
+    max_boot: int = 100_000,
+    target_confidence: float = 0.95,
+    shard: tuple[int, int] = (0, 1),
+) -> np.ndarray:
+    """Bootstrap replicates of one model, with shape `(len(field_names), n_replicates)`.
+
+    Replicates are drawn by blocks of `REPLICATE_BLOCK_SIZE`, each with its own seed stream, so
+    that `shard=(i, n_shards)` draws the i-th contiguous range of blocks: concatenating the
+    replicates of every shard gives the replicates of an unsharded run.
+
+    With `adaptive`, blocks are drawn until the rounded score and CI of every field are stable
+    at `target_confidence` (at most `max_boot`), and `n_boot` is ignored.
+    """
+    model_key = (provider, model, str(n_hints))
+    bootstraps = [
+        StratifiedBootstrap(
+            *get_ppi_inputs(ppi_arrays, calibration_index, provider, model, n_hints, field_name)
+        )
+        for field_name in field_names
+    ]
+
+    def draw_block(block: int, n: int) -> np.ndarray:
+        if bootstrap_mode == "indices":
+            # All fields are judged on the same predictions, so they share the row draws.
+            rng = np.random.default_rng(get_seed_sequence(seed, *model_key, str(block)))
+            return joint_point_estimates(bootstraps, rng, n)
+        return np.stack(
+            [
+                bootstrap.point_estimates(
+                    np.random.default_rng(
+                        get_seed_sequence(seed, *model_key, field_name, str(block))
+                    ),
+                    n,
+                    mode=bootstrap_mode,
+                )
+                for field_name, bootstrap in zip(field_names, bootstraps)
+            ]
+        )
+
+    shard_index, n_shards = shard
+    if adaptive:
+        if n_shards > 1:
+            raise ValueError("Adaptive bootstrap runs cannot be sharded")
+        blocks = itertools.count()
+        return adaptive_point_estimates(
+            lambda n: draw_block(next(blocks), n),
+            chunk_size=REPLICATE_BLOCK_SIZE,
+            max_boot=max_boot,
+            confidence=target_confidence,
+        )
+    n_blocks = get_n_blocks(n_boot)
+    if n_shards > n_blocks:
+        raise ValueError(
+            f"{n_boot} replicates make {n_blocks} blocks, too few for {n_shards} shards"
+        )
+    blocks = range(n_blocks)[
+        shard_index * n_blocks // n_shards : (shard_index + 1) * n_blocks // n_shards
+    ]
+    return np.concatenate(
+        [np.empty((len(field_names), 0))]
+        + [
+            draw_block(block, min(REPLICATE_BLOCK_SIZE, n_boot - block * REPLICATE_BLOCK_SIZE))
+            for block in blocks
+        ],
+        axis=1,
     )
-    df_unlabelled = df_ppi.filter(pl.col("model") == model)
-    distribution = df_unlabelled.get_column(judge_field_name).value_counts()
-    n_samples = (
-        distribution.with_columns(pl.col("count").alias("n_samples"))
-        .select(judge_field_name, "n_samples")
-        .to_dicts()
+
+
+def get_normal_approximations(
+    ppi_arrays: dict[str, np.ndarray],
+    calibration_index: dict[str, np.ndarray],
+    provider: str,
+    model: str,
+    n_hints: int = 0,
+    field_names: t.Sequence[str] = ("both_correct",),
+) -> np.ndarray:
+    """Mean and standard error of the bootstrap of one model, shape `(len(field_names), 2)`."""
+    return np.array(
+        [
+            StratifiedBootstrap(
+                *get_ppi_inputs(ppi_arrays, calibration_index, provider, model, n_hints, field_name)
+            ).normal_approximation()
+            for field_name in field_names
+        ]
     )
-    sub_dfs = []
-    for elem in n_samples:
-        value, count = elem[judge_field_name], elem["n_samples"]
-        sub_dfs.append(
-            df_labelled_unsampled.filter(pl.col(judge_field_name) == value).sample(
-                count, with_replacement=True, shuffle=True
+
+
+def score_model(*args, **kwargs) -> list[tuple[float, float]]:
+    """Score and CI of one model for every field, see `get_point_estimates` for arguments."""
+    return [
+        get_score_and_ci(field_point_estimates)
+        for field_point_estimates in get_point_estimates(*args, **kwargs)
+    ]
+
+
+_worker_ppi_arrays: dict[str, np.ndarray] = {}
+_worker_calibration_index: dict[str, np.ndarray] = {}
+
+
+def _init_worker(ppi_arrays: dict[str, np.ndarray], calibration_index: dict[str, np.ndarray]):
+    global _worker_ppi_arrays, _worker_calibration_index
+    _worker_ppi_arrays = ppi_arrays
+    _worker_calibration_index = calibration_index
+
+
+def _get_point_estimates_in_worker(*args, **kwargs) -> np.ndarray:
+    return get_point_estimates(_worker_ppi_arrays, _worker_calibration_index, *args, **kwargs)
+
+
+def get_all_point_estimates(
+    ppi_arrays: dict[str, np.ndarray],
+    calibration_index: dict[str, np.ndarray],
+    models: list[tuple[str, str, int]],
+    workers: int = 1,
+    cache: bool = False,
+    **kwargs,
+) -> list[np.ndarray]:
+    """Replicates of every model of `models`, see `get_point_estimates` for `kwargs`.
+
+    With `cache`, replicates are persisted per model under a content hash of their inputs, and
+    only models that are new or whose jury values, calibration pool or settings changed are
+    bootstrapped again.
+    """
+    point_estimates: dict[tuple[str, str, int], np.ndarray] = {}
+    cache_paths = {}
+    if cache:
+        for key in models:
+            cache_paths[key] = get_score_cache_path(ppi_arrays, calibration_index, *key, **kwargs)
+            cached_point_estimates = load_point_estimates(cache_paths[key])
+            if cached_point_estimates is not None:
+                point_estimates[key] = cached_point_estimates
+        print(f"Loaded {len(point_estimates)}/{len(models)} models from the score cache")
+    missing = [key for key in models if key not in point_estimates]
+    if workers > 1 and len(missing) > 1:
+        # Arrays are sent once per worker process, tasks only carry the model key.
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(ppi_arrays, calibration_index)
+        ) as executor:
+            futures = [
+                executor.submit(_get_point_estimates_in_worker, *key, **kwargs) for key in missing
+            ]
+            new_point_estimates = (future.result() for future in futures)
+            for key, model_point_estimates in tqdm(
+                zip(missing, new_point_estimates),
+                total=len(missing),
+                desc="Computing benchmark results",
+            ):
+                point_estimates[key] = model_point_estimates
+    else:
+        for key in tqdm(missing, desc="Computing benchmark results"):
+            point_estimates[key] = get_point_estimates(
+                ppi_arrays, calibration_index, *key, **kwargs
+            )
+    if cache:
+        for key in missing:
+            save_point_estimates(cache_paths[key], point_estimates[key])
+    return [point_estimates[key] for key in models]
+
+
+def get_multi_target_results(
+    df_ppi: pl.DataFrame,
+    field_names: t.Sequence[str] = FIELD_NAMES,
+    n_boot: int = 10_000,
+    seed: int = 0,
+    bootstrap_mode: BootstrapMode = "indices",
+    workers: int = 1,
+    calibration_index: dict[str, np.ndarray] | None = None,
+    adaptive: bool = False,
+    max_boot: int = 100_000,
+    target_confidence: float = 0.95,
+    cache: bool = False,
+    method: Method = "bootstrap",
+    shard: tuple[int, int] | None = None,
+) -> pl.DataFrame:
+    """Score every (provider, model, n_hints) of the PPI table on every field of `field_names`.
+
+    Each model draws from its own seed stream derived from `seed`, `provider`, `model` and
+    `n_hints`, so scores do not depend on `workers`, on the order in which models are processed
+    nor on which other fields are scored in the same run.
+
+    The `"analytic"` method computes scores from the normal approximation of the bootstrap
+    instead, and only samples from it (`n_boot` times) to estimate ranks.
+
+    With `shard`, only that shard's replicates are drawn and scores are left null: they are
+    computed from the replicates of every shard by `merge_shards`.
+    """
+    if calibration_index is None:
+        calibration_index = build_calibration_index(df_ppi)
+    ppi_arrays = get_ppi_arrays(df_ppi, field_names=field_names)
+    models = df_ppi.select("provider", "model", "n_hints").unique(maintain_order=True).rows()
+    if method == "analytic":
+        approximations = [
+            get_normal_approximations(ppi_arrays, calibration_index, *key, field_names=field_names)
+            for key in models
+        ]
+        scores = [
+            [get_normal_score_and_ci(mean, standard_error) for mean, standard_error in approx]
+            for approx in approximations
+        ]
+        point_estimates = [
+            np.random.default_rng(get_seed_sequence(seed, provider, model, str(n_hints))).normal(
+                approx[:, [0]], approx[:, [1]], size=(len(field_names), n_boot)
             )
+            for (provider, model, n_hints), approx in zip(models, approximations)
+        ]
+    else:
+        point_estimates = get_all_point_estimates(
+            ppi_arrays,
+            calibration_index,
+            models,
+            workers=workers,
+            cache=cache,
+            field_names=tuple(field_names),
+            seed=seed,
+            n_boot=n_boot,
+            bootstrap_mode=bootstrap_mode,
+            adaptive=adaptive,
+            max_boot=max_boot,
+            target_confidence=target_confidence,
+            shard=shard or (0, 1),
         )
-    df_labelled = pl.concat(sub_dfs, how="vertical")
-    Y_hat_unlabelled = df_unlabelled[judge_field_name].to_numpy().astype(float)
-    Y = df_labelled[f"human_{field_name}"].to_numpy().astype(float)
-    Y_hat = df_labelled[judge_field_name].to_numpy().astype(float)
-    return Y, Y_hat, Y_hat_unlabelled
+        scores = [
+            [
+                get_score_and_ci(field_point_estimates) if shard is None else (None, None)
+                for field_point_estimates in model_estimates
+            ]
+            for model_estimates in point_estimates
+        ]
+    df_results = pl.DataFrame(
+        [
+            {
+                "provider": provider,
+                "model": model,
+                "n_hints": n_hints,
+                "field_name": field_name,
+                "score": score,
+                "95% CI (±)": ci,
+            }
+            for (provider, model, n_hints), model_scores in zip(models, scores)
+            for field_name, (score, ci) in zip(field_names, model_scores)
+        ]
+    )
+    # Replicates are kept along the scores so that ranks can be bootstrapped too.
+    return df_results.with_columns(
+        pl.Series(
+            "point_estimates",
+            [
+                field_point_estimates
+                for model_point_estimates in point_estimates
+                for field_point_estimates in model_point_estimates
+            ],
+        ).cast(pl.List(pl.Float64))
+    )
 
 
-def get_ppi_results(df_ppi: pl.DataFrame, provider: str, model: str, field_name="both_correct"):
-    Y, Y_hat, Y_hat_unlabelled = get_ppi_inputs(df_ppi, provider, model, field_name)
-    ppi_pointestimate = ppi_mean_pointestimate(Y, Y_hat, Y_hat_unlabelled)
-    return ppi_pointestimate
+def get_benchmark_results(
+    df_ppi: pl.DataFrame,
+    field_name="both_correct",
+    n_boot: int = 10_000,
+    seed: int = 0,
+    bootstrap_mode: BootstrapMode = "indices",
+    workers: int = 1,
+    calibration_index: dict[str, np.ndarray] | None = None,
+    **kwargs,
+) -> pl.DataFrame:
+    return get_multi_target_results(
+        df_ppi,
+        field_names=(field_name,),
+        n_boot=n_boot,
+        seed=seed,
+        bootstrap_mode=bootstrap_mode,
+        workers=workers,
+        calibration_index=calibration_index,
+        **kwargs,
+    ).drop("field_name")
 
 
-def get_benchmark_results(df_ppi: pl.DataFrame, field_name="both_correct") -> pl.DataFrame:
-    results = {
-        "provider": [],
-        "model": [],
-        "score": [],
-        "95% CI (±)": [],
-    }
-    for provider, model in tqdm(
-        df_ppi.select("provider", "model").unique().iter_rows(),
-        total=df_ppi.select("provider", "model").unique().height,
-        desc="Computing benchmark results"
-    ):
-        ppi_point_estimates = []
-        for _ in range(10_000):
-            ppi_pointestimate = get_ppi_results(df_ppi, provider, model, field_name=field_name)
-            ppi_point_estimates.append(ppi_pointestimate[0])
-        ppi_ci_lower = np.percentile(ppi_point_estimates, 2.5)
-        ppi_ci_upper = np.percentile(ppi_point_estimates, 97.5)
-        results["provider"].append(provider)
-        results["model"].append(model)
-        score = (ppi_ci_upper + ppi_ci_lower) / 2
-        results["score"].append((score * 100).round(1))
-        spread = (ppi_ci_upper - ppi_ci_lower) / 2
-        results["95% CI (±)"].append((np.floor(spread * 100 * 10) + 1) / 10)
-    results = pl.DataFrame(results)
-    return results
+def get_replicate_matrix(results_df: pl.DataFrame) -> np.ndarray:
+    """`(n_boot, n_models)` matrix of the `point_estimates` column of `results_df`.
+
+    Adaptive runs draw a different number of replicates per model, only the first replicates
+    common to every model are kept.
+    """
+    n_boot = results_df["point_estimates"].list.len().min()
+    return (
+        results_df["point_estimates"]
+        .list.head(n_boot)
+        .explode()
+        .to_numpy()
+        .reshape(len(results_df), n_boot)
+        .T
+    )
 
 
 def compute_final_ranks(results_df: pl.DataFrame) -> pl.DataFrame:
-    results_df = results_df.with_columns(
-        pl.col("score").rank(descending=True).cast(pl.UInt64).alias("rank")
-    )
-    results_df = results_df.with_columns(
-        pl.col("score").sub(pl.col("95% CI (±)")).alias("ppi_ci_lower"),
-        pl.col("score").add(pl.col("95% CI (±)")).alias("ppi_ci_upper"),
-    )
-    rank_spread = (
-        results_df.join(results_df, how="cross", suffix="_other")
-        .group_by("model")
-        .agg(
-            (pl.col("ppi_ci_lower_other") > pl.col("ppi_ci_upper"))
-            .sum()
-            .add(1)
-            .alias("best_possible_rank"),
-            (pl.col("ppi_ci_upper_other") >= pl.col("ppi_ci_lower"))
-            .sum()
-            .alias("worst_possible_rank"),
-        )
-    ).with_columns(
-        (
-            pl.col("best_possible_rank").cast(pl.String)
-            + pl.lit(" <--> ")
-            + pl.col("worst_possible_rank").cast(pl.String)
-        ).alias("rank_spread")
-    )
+    """Rank models by score, with the 95% interval of their rank across bootstrap replicates."""
+    ranks = get_replicate_ranks(get_replicate_matrix(results_df))
+    best_possible_rank = np.percentile(ranks, 2.5, axis=0, method="lower")
+    worst_possible_rank = np.percentile(ranks, 97.5, axis=0, method="higher")
     return (
-        results_df.join(rank_spread, on="model", how="left")
+        results_df.with_columns(
+            pl.col("score").rank(method="min", descending=True).cast(pl.UInt64).alias("rank"),
+            pl.Series(
+                "rank_spread",
+                [
+                    f"{best} <--> {worst}"
+                    for best, worst in zip(best_possible_rank, worst_possible_rank)
+                ],
+            ),
+        )
         .sort(by="rank")
-        .drop("ppi_ci_lower", "ppi_ci_upper", "best_possible_rank", "worst_possible_rank")
+        .drop("point_estimates")
     )
 
 
-def main(field_name: str, split: str):
-    df_ppi = pl.read_ndjson(
-        f"hf://datasets/rvienne/layton-eval-ppi/ppi_{split}.jsonl", infer_schema_length=100000
+def get_rank_details(results_df: pl.DataFrame) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """Rank distribution of every model and probability that each model beats each other one.
+
+    The first table has one row per model with `P(rank = k)` for k = 1..n_models, the second
+    one row per ordered pair of models.
+    """
+    point_estimates = get_replicate_matrix(results_df)
+    models = results_df["model"].to_list()
+    df_rank_probabilities = pl.DataFrame(
+        {
+            "model": models,
+            "rank_probabilities": get_rank_probabilities(get_replicate_ranks(point_estimates)),
+        }
     )
-    results_df = get_benchmark_results(df_ppi, field_name=field_name)
+    df_win_probabilities = pl.DataFrame(
+        {
+            "model": np.repeat(models, len(models)),
+            "other_model": np.tile(models, len(models)),
+            "win_probability": get_win_probabilities(point_estimates).ravel(),
+        }
+    ).filter(pl.col("model") != pl.col("other_model"))
+    return df_rank_probabilities, df_win_probabilities
+
+
+def get_results_suffix(method: Method) -> str:
+    """Suffix of the results files of `method`: only bootstrap runs write the official ones."""
+    return "" if method == "bootstrap" else f"_{method}"
+
+
+def write_results(
+    results_df: pl.DataFrame,
+    split: str,
+    rank_details: bool = False,
+    method: Method = "bootstrap",
+):
+    """Write the ranked leaderboard of `split` from single-field results.
+
+    With `rank_details`, also write the rank distribution of every model and the pairwise
+    probabilities that a model beats another one.
+    """
+    suffix = get_results_suffix(method)
     df_final = compute_final_ranks(results_df).select(
         "rank",
         "rank_spread",
@@ -117,12 +456,339 @@ def main(field_name: str, split: str):
         "95% CI (±)",
         "provider",
     )
-    df_final.write_ndjson(f"results_{split}.jsonl")
+    df_final.write_ndjson(f"results_{split}{suffix}.jsonl")
+    if rank_details:
+        df_rank_probabilities, df_win_probabilities = get_rank_details(results_df)
+        df_rank_probabilities.write_ndjson(f"rank_probabilities_{split}{suffix}.jsonl")
+        df_win_probabilities.write_ndjson(f"win_probabilities_{split}{suffix}.jsonl")
+
+
+def write_all_results(results_df: pl.DataFrame, method: Method = "bootstrap"):
+    """Write the leaderboards of every split, hint level and field, ranked separately."""
+    pl.concat(
+        compute_final_ranks(df_target)
+        for _, df_target in results_df.group_by(
+            "split", "n_hints", "field_name", maintain_order=True
+        )
+    ).select(
+        "split",
+        "n_hints",
+        "field_name",
+        "rank",
+        "rank_spread",
+        "model",
+        "score",
+        "95% CI (±)",
+        "provider",
+    ).write_ndjson(f"results_all{get_results_suffix(method)}.jsonl")
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """Parse a `i/N` shard specification, with 0 <= i < N."""
+    try:
+        shard_index, n_shards = map(int, shard.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected a shard like 0/4, got {shard!r}") from None
+    if not 0 <= shard_index < n_shards:
+        raise argparse.ArgumentTypeError(f"Shard index must be in [0, {n_shards}), got {shard!r}")
+    return shard_index, n_shards
+
+
+def write_shard(
+    results_df: pl.DataFrame,
+    split: str,
+    shard: tuple[int, int],
+    seed: int,
+    n_boot: int,
+    all_targets: bool = False,
+):
+    """Write the replicates of one shard, to be merged with `merge_shards`.
+
+    The `seed` and `n_boot` of the run are stored along, shards of different runs do not merge.
+    """
+    shard_index, n_shards = shard
+    prefix = "replicates_all" if all_targets else "replicates"
+    results_df.select(
+        pl.lit(split).alias("split"),
+        pl.lit(shard_index).alias("shard_index"),
+        pl.lit(n_shards).alias("n_shards"),
+        pl.lit(seed).alias("seed"),
+        pl.lit(n_boot).alias("n_boot"),
+        "provider",
+        "model",
+        "n_hints",
+        "field_name",
+        "point_estimates",
+    ).write_ipc(f"{prefix}_{split}_{shard_index}-of-{n_shards}.arrow", compression="zstd")
+
+
+def merge_shards(shard_files: t.Sequence[str]) -> pl.DataFrame:
+    """Results of every split found in `shard_files`, from their concatenated replicates.
+
+    Shards of a split are concatenated in shard order, which gives the replicates, and hence
+    the scores and ranks, of an unsharded run.
+    """
+    shard_dfs = [pl.read_ipc(shard_file, memory_map=False) for shard_file in shard_files]
+    # One row per shard file, each holds a single shard of a single split.
+    df_runs = pl.concat(
+        [
+            df.select("split", "shard_index", "n_shards", "seed", "n_boot").unique()
+            for df in shard_dfs
+        ]
+    )
+    duplicates = df_runs.filter(pl.struct("split", "shard_index").is_duplicated())
+    if len(duplicates):
+        raise ValueError(
+            f"Shards given more than once: {sorted(set(duplicates['split', 'shard_index'].rows()))}"
+        )
+    for (split,), df_split in df_runs.group_by("split"):
+        for column in ("n_shards", "seed", "n_boot"):
+            if df_split[column].n_unique() != 1:
+                raise ValueError(
+                    f"Shards of split {split!r} come from different runs: "
+                    f"{column} {sorted(df_split[column].unique().to_list())}"
+                )
+        n_shards = df_split["n_shards"][0]
+        shard_indices = sorted(df_split["shard_index"].to_list())
+        if shard_indices != list(range(n_shards)):
+            raise ValueError(
+                f"Incomplete shards for split {split!r}: got {shard_indices} out of {n_shards}"
+            )
+    df_shards = pl.concat(shard_dfs)
+    results_df = (
+        df_shards.sort("shard_index", maintain_order=True)
+        .group_by("split", "provider", "model", "n_hints", "field_name", maintain_order=True)
+        .agg(pl.col("point_estimates").explode())
+    )
+    scores = [
+        get_score_and_ci(point_estimates) for point_estimates in get_replicate_matrix(results_df).T
+    ]
+    return results_df.with_columns(
+        pl.Series("score", [score for score, _ in scores]),
+        pl.Series("95% CI (±)", [ci for _, ci in scores]),
+    )
+
+
+def load_ppi(split: str, ppi_dir: str | None = None) -> pl.DataFrame:
+    """PPI table of `split`, from the hub or from `ppi_dir` (e.g. `build_ppi_dataset` outputs)."""
+    if ppi_dir is None:
+        return read_ppi(split)
+    return read_table(Path(ppi_dir) / f"ppi_{split}", schema=get_schema("ppi"))
+
+
+def main(
+    field_name: str,
+    split: str,
+    rank_details: bool = False,
+    shard: tuple[int, int] | None = None,
+    ppi_dir: str | None = None,
+    method: Method = "bootstrap",
+    n_boot: int = 10_000,
+    seed: int = 0,
+    **kwargs,
+):
+    """Write the ranked leaderboard of `split`, `kwargs` are forwarded to the scoring.
+
+    With `shard`, only write that shard's replicates, see `merge_shards`.
+    """
+    df_ppi = load_ppi(split, ppi_dir)
+    results_df = get_multi_target_results(
+        df_ppi,
+        field_names=(field_name,),
+        calibration_index=load_calibration_index(df_ppi, split),
+        method=method,
+        n_boot=n_boot,
+        seed=seed,
+        shard=shard,
+        **kwargs,
+    )
+    if shard is not None:
+        write_shard(results_df, split, shard, seed, n_boot)
+    else:
+        write_results(
+            results_df.drop("field_name"), split, rank_details=rank_details, method=method
+        )
+
+
+def compare_methods(
+    split: str, field_name: str = "both_correct", ppi_dir: str | None = None, **kwargs
+) -> pl.DataFrame:
+    """Divergence of the analytic method from the published bootstrap results of `split`."""
+    df_ppi = load_ppi(split, ppi_dir)
+    df_analytic = get_benchmark_results(
+        df_ppi,
+        calibration_index=load_calibration_index(df_ppi, split),
+        field_name=field_name,
+        method="analytic",
+        **kwargs,
+    ).filter(pl.col("n_hints") == 0)
+    df_bootstrap = read_table(
+        settings.root_dir / "benchmark_results" / f"results_{split}",
+        schema=get_schema("leaderboard"),
+    )
+    return (
+        df_bootstrap.join(df_analytic, on=["provider", "model"], suffix="_analytic")
+        .select(
+            "provider",
+            "model",
+            "score",
+            "score_analytic",
+            pl.col("score_analytic").sub(pl.col("score")).round(1).alias("score_diff"),
+            "95% CI (±)",
+            "95% CI (±)_analytic",
+            pl.col("95% CI (±)_analytic").sub(pl.col("95% CI (±)")).round(1).alias("ci_diff"),
+        )
+        .sort("score", descending=True)
+    )
+
+
+def main_all_targets(
+    splits: t.Sequence[str] = ("llm", "vlm"),
+    shard: tuple[int, int] | None = None,
+    ppi_dir: str | None = None,
+    method: Method = "bootstrap",
+    n_boot: int = 10_000,
+    seed: int = 0,
+    **kwargs,
+):
+    """Score every field, split and hint level in one pass, into a single results table."""
+    results = []
+    for split in splits:
+        df_ppi = load_ppi(split, ppi_dir)
+        results_df = get_multi_target_results(
+            df_ppi,
+            calibration_index=load_calibration_index(df_ppi, split),
+            method=method,
+            n_boot=n_boot,
+            seed=seed,
+            shard=shard,
+            **kwargs,
+        )
+        if shard is not None:
+            write_shard(results_df, split, shard, seed, n_boot, all_targets=True)
+        results.append(results_df.insert_column(0, pl.lit(split).alias("split")))
+    if shard is None:
+        write_all_results(pl.concat(results), method=method)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--field-name", type=str, default="both_correct")
     parser.add_argument("--split", type=str, default="llm")
+    parser.add_argument(
+        "--ppi-dir",
+        type=str,
+        default=None,
+        help="Read ppi_{split}.arrow/.parquet/.jsonl from this folder instead of the hub",
+    )
+    parser.add_argument("--n-boot", type=int, default=10_000, help="Bootstrap replicates per model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--bootstrap-mode",
+        type=str,
+        choices=t.get_args(BootstrapMode),
+        default="indices",
+        help="'counts' samples per-bin label counts instead of rows, use it for --n-boot >= 1M",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of processes used to score models"
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Draw replicates until the rounded score and CI are stable, ignores --n-boot",
+    )
+    parser.add_argument("--max-boot", type=int, default=100_000, help="Cap for --adaptive")
+    parser.add_argument("--target-confidence", type=float, default=0.95)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse cached replicates of models whose inputs did not change since the last run",
+    )
+    parser.add_argument(
+        "--rank-details",
+        action="store_true",
+        help="Also write rank probabilities and pairwise win probabilities of --split",
+    )
+    parser.add_argument(
+        "--method",
+        type=str,
+        choices=t.get_args(Method),
+        default="bootstrap",
+        help=(
+            "'analytic' uses the normal approximation of the bootstrap, for quick checks only: "
+            "it writes results_{split}_analytic.jsonl"
+        ),
+    )
+    parser.add_argument(
+        "--compare-methods",
+        action="store_true",
+        help="Print how far the analytic method is from benchmark_results/results_{split}.jsonl",
+    )
+    parser.add_argument(
+        "--all-targets",
+        action="store_true",
+        help="Score every field, split and hint level into results_all.jsonl",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="Only draw the i-th of N slices of the replicates (e.g. 0/4) into a replicates file",
+    )
+    parser.add_argument(
+        "--merge-shards",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Replicates files of every shard, merged into the results of an unsharded run",
+    )
     args = parser.parse_args()
-    main(args.field_name, args.split)
+    if args.shard is not None and (args.adaptive or args.method == "analytic"):
+        parser.error("--shard only applies to fixed-size bootstrap runs")
+    if args.shard is not None and args.shard[1] > get_n_blocks(args.n_boot):
+        parser.error(
+            f"--n-boot {args.n_boot} makes {get_n_blocks(args.n_boot)} blocks of "
+            f"{REPLICATE_BLOCK_SIZE} replicates, use at most that many shards"
+        )
+    scoring_kwargs = {
+        "n_boot": args.n_boot,
+        "seed": args.seed,
+        "bootstrap_mode": args.bootstrap_mode,
+        "workers": args.workers,
+        "adaptive": args.adaptive,
+        "max_boot": args.max_boot,
+        "target_confidence": args.target_confidence,
+        "cache": args.incremental,
+        "method": args.method,
+    }
+    if args.compare_methods:
+        df_comparison = compare_methods(
+            args.split, args.field_name, ppi_dir=args.ppi_dir, seed=args.seed
+        )
+        with pl.Config(tbl_rows=-1, tbl_cols=-1):
+            print(df_comparison)
+        print(
+            df_comparison.select(
+                pl.col("score_diff", "ci_diff").abs().max().name.prefix("max_abs_"),
+                pl.col("score_diff", "ci_diff").abs().mean().name.prefix("mean_abs_"),
+            )
+        )
+    elif args.merge_shards and args.all_targets:
+        write_all_results(merge_shards(args.merge_shards))
+    elif args.merge_shards:
+        for (split,), results_df in merge_shards(args.merge_shards).group_by("split"):
+            write_results(
+                results_df.drop("split", "field_name"), split, rank_details=args.rank_details
+            )
+    elif args.all_targets:
+        main_all_targets(shard=args.shard, ppi_dir=args.ppi_dir, **scoring_kwargs)
+    else:
+        main(
+            args.field_name,
+            args.split,
+            rank_details=args.rank_details,
+            shard=args.shard,
+            ppi_dir=args.ppi_dir,
+            **scoring_kwargs,
+        )
@@ -1,39 +1,51 @@
 import argparse
-import glob
+import typing as t
+from pathlib import Path
 
 import polars as pl
 
+from layton_eval.judgement_cache import with_cached_judgements
+from layton_eval.jury import (
+    JURY_FIELDS,
+    JuryPolicy,
+    aggregate_jury,
+    get_jury_file_names,
+    get_jury_size,
+    get_verdicts,
+)
+from layton_eval.schemas import get_schema
+from layton_eval.storage import TableFormat, find_tables, read_tables, write_table
 
-def main(glob_prefix: str):
-    df = (
-        pl.read_ndjson(glob.glob(f"{glob_prefix}*.jsonl"))["id", "custom_id", "answer", "model"]
-        .with_columns(
-            pl.col("answer")
-            .str.json_decode(
-                dtype=pl.Struct(
-                    fields={"is_answer_correct": pl.Boolean, "is_justification_correct": pl.Boolean}
-                )
-            )
-            .struct.unnest()
-        )
-        .with_columns(
-            pl.col("is_answer_correct")
-            .and_(pl.col("is_justification_correct"))
-            .alias("both_correct")
+
+def main(glob_prefix: str, output_format: TableFormat = "jsonl", policy: JuryPolicy = "agree"):
+    judge_file_name = Path(glob_prefix).name
+    df = get_verdicts(
+        with_cached_judgements(
+            read_tables(find_tables(f"{glob_prefix}*"), schema=get_schema("batch_result"))[
+                "id", "custom_id", "answer", "model"
+            ],
+            get_jury_file_names(judge_file_name),
         )
     )
     print(df)
-    df = df.group_by("custom_id").agg(
-        pl.col("is_answer_correct").mean().round(2).alias("answer_correctness"),
-        pl.col("is_justification_correct").mean().round(2).alias("justification_correctness"),
-        pl.col("both_correct").mean().round(2).alias("both_correctness"),
+    df = aggregate_jury(df, get_jury_size(judge_file_name), policy).with_columns(
+        pl.col(JURY_FIELDS.values()).round(2)
     )
-    output_file_path = f"{glob_prefix.replace('judge_', 'jury_')}.jsonl"
-    df.write_ndjson(output_file_path)
+    write_table(df, glob_prefix.replace("judge_", "jury_"), output_format)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--glob-prefix", type=str, required=True)
+    parser.add_argument(
+        "--output-format", type=str, choices=t.get_args(TableFormat), default="jsonl"
+    )
+    parser.add_argument(
+        "--jury-policy",
+        type=str,
+        choices=t.get_args(JuryPolicy),
+        default="agree",
+        help="Jury value of predictions judged by part of the jury, see `layton_eval.jury`",
+    )
     args = parser.parse_args()
-    main(args.glob_prefix)
+    main(args.glob_prefix, output_format=args.output_format, policy=args.jury_policy)
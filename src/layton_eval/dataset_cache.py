@@ -0,0 +1,126 @@
+import hashlib
+import typing as t
+import urllib.error
+import urllib.request
+import warnings
+from pathlib import Path
+
+import polars as pl
+
+from layton_eval.schemas import get_schema
+from layton_eval.settings import settings
+
+DATASET_CACHE_DIR = settings.root_dir / "cache" / "datasets"
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def get_file_url(repo_id: str, filename: str, revision: str = "main") -> str:
+    return f"{settings.hf_endpoint}/datasets/{repo_id}/resolve/{revision}/{filename}"
+
+
+def _request(url: str, method: str = "GET") -> urllib.request.Request:
+    headers = {"Authorization": f"Bearer {settings.hf_token}"} if settings.hf_token else {}
+    return urllib.request.Request(url, method=method, headers=headers)
+
+
+def get_remote_etag(repo_id: str, filename: str, revision: str = "main") -> str:
+    """Content identifier of a dataset file, as served by the hub.
+
+    With `settings.hf_hub_dir`, files are read from `{hf_hub_dir}/{repo_id}/{filename}` instead,
+    and identified by the hash of their content.
+    """
+    if settings.hf_hub_dir is not None:
+        path = settings.hf_hub_dir / repo_id / filename
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    # Large files redirect to a CDN, the hub only exposes their hash on the first response.
+    opener = urllib.request.build_opener(_NoRedirect)
+    try:
+        response = opener.open(_request(get_file_url(repo_id, filename, revision), "HEAD"))
+    except urllib.error.HTTPError as error:
+        if error.code not in (301, 302, 303, 307, 308):
+            raise
+        response = error
+    etag = response.headers.get("X-Linked-Etag") or response.headers.get("ETag")
+    if etag is None:
+        raise ValueError(f"No ETag returned for {repo_id}/{filename}@{revision}")
+    return etag.removeprefix("W/").strip('"')
+
+
+def download_file(repo_id: str, filename: str, revision: str = "main") -> bytes:
+    if settings.hf_hub_dir is not None:
+        return (settings.hf_hub_dir / repo_id / filename).read_bytes()
+    with urllib.request.urlopen(_request(get_file_url(repo_id, filename, revision))) as response:
+        return response.read()
+
+
+def _write_atomically(path: Path, write: t.Callable[[Path], t.Any]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    write(tmp_path)
+    tmp_path.replace(path)
+
+
+def get_dataset_path(
+    repo_id: str, filename: str, revision: str = "main", schema: pl.Schema | None = None
+) -> Path:
+    """Local copy of a jsonl file of a hub dataset, an Arrow file cached under its ETag.
+
+    Every run only asks the hub for the ETag of the file. The file is downloaded and parsed
+    again only when it changed. With `settings.hf_hub_offline`, or when the hub cannot be
+    reached, the last version read for this revision is used.
+
+    Cached tables are uncompressed Arrow IPC files, memory-mapped instead of parsed. With a
+    `schema`, the file is parsed with it instead of inferring one, and only its columns are kept.
+    """
+    cache_dir = DATASET_CACHE_DIR / repo_id / Path(filename).stem
+    ref_path = cache_dir / f"{revision.replace('/', '--')}.ref"
+    etag = None
+    if not settings.hf_hub_offline:
+        try:
+            etag = get_remote_etag(repo_id, filename, revision)
+        except (urllib.error.URLError, OSError) as error:
+            if not ref_path.exists():
+                raise
+            warnings.warn(f"Could not reach the hub ({error}), using cached {filename}")
+    if etag is None:
+        if not ref_path.exists():
+            raise FileNotFoundError(
+                f"{repo_id}/{filename}@{revision} was never cached, it cannot be read offline"
+            )
+        etag = ref_path.read_text().strip()
+    # The schema is part of the key: changing it must not return a table parsed with the old one.
+    key = etag if schema is None else f"{etag}/{schema!r}"
+    arrow_path = cache_dir / f"{hashlib.sha256(key.encode()).hexdigest()[:16]}.arrow"
+    if not arrow_path.exists():
+        data = download_file(repo_id, filename, revision)
+        if schema is not None:
+            df = pl.read_ndjson(data, schema=schema)
+        else:
+            df = pl.read_ndjson(data, infer_schema_length=None)
+        _write_atomically(arrow_path, lambda path: df.write_ipc(path, compression="uncompressed"))
+    _write_atomically(ref_path, lambda path: path.write_text(etag))
+    return arrow_path
+
+
+def read_dataset(*args, **kwargs) -> pl.DataFrame:
+    """Read a hub dataset file, see `get_dataset_path` for arguments."""
+    return pl.read_ipc(get_dataset_path(*args, **kwargs), memory_map=True)
+
+
+def scan_dataset(*args, **kwargs) -> pl.LazyFrame:
+    """Lazily read a hub dataset file: only selected columns and filtered rows are loaded."""
+    return pl.scan_ipc(get_dataset_path(*args, **kwargs), memory_map=True)
+
+
+def scan_layton_eval(split: str) -> pl.LazyFrame:
+    return scan_dataset(
+        "rvienne/layton-eval", f"layton_eval_{split}.jsonl", schema=get_schema("riddle")
+    )
+
+
+def read_ppi(split: str) -> pl.DataFrame:
+    return read_dataset("rvienne/layton-eval-ppi", f"ppi_{split}.jsonl", schema=get_schema("ppi"))
@@ -1,99 +1,111 @@
 import argparse
+import typing as t
 
 import numpy as np
 import polars as pl
-from ppi_py import ppi_mean_pointestimate
 
+from layton_eval.bootstrap import (
+    BootstrapMode,
+    Method,
+    StratifiedBootstrap,
+    adaptive_point_estimates,
+    get_judge_field_name,
+    get_normal_score_and_ci,
+    get_score_and_ci,
+)
+from layton_eval.calibration_index import get_calibration_pool, load_calibration_index
+from layton_eval.dataset_cache import read_ppi
+from layton_eval.judgement_cache import with_cached_judgements
+from layton_eval.jury import (
+    JuryPolicy,
+    aggregate_jury,
+    get_jury_file_names,
+    get_jury_size,
+    get_verdicts,
+)
+from layton_eval.schemas import get_schema
+from layton_eval.storage import get_table_stem, read_tables
 
-def get_jury_df(judge_files: list[str]):
-    return (
-        pl.read_ndjson(judge_files)["custom_id", "answer"]
-        .with_columns(
-            pl.col("answer")
-            .str.json_decode(
-                dtype=pl.Struct(
-                    fields={"is_answer_correct": pl.Boolean, "is_justification_correct": pl.Boolean}
-                )
-            )
-            .struct.unnest()
-        )
-        .with_columns(
-            pl.col("is_answer_correct")
-            .and_(pl.col("is_justification_correct"))
-            .alias("both_correct")
-        )
-        .group_by("custom_id")
-        .agg(
-            pl.col("is_answer_correct").mean().alias("answer_correctness"),
-            pl.col("is_justification_correct").mean().alias("justification_correctness"),
-            pl.col("both_correct").mean().alias("both_correctness"),
+
+def get_jury_df(judge_files: list[str], policy: JuryPolicy = "agree"):
+    # Results are named `{raw judge file}_by_{judge}`: read the cache of every raw file of the jury.
+    judge_file_names = {
+        name
+        for path in judge_files
+        for name in get_jury_file_names(get_table_stem(path).name.rsplit("_by_", 1)[0])
+    }
+    df = get_verdicts(
+        with_cached_judgements(
+            read_tables(judge_files, schema=get_schema("batch_result"))[
+                "custom_id", "answer", "model"
+            ],
+            sorted(judge_file_names),
         )
     )
+    return aggregate_jury(df, max(map(get_jury_size, judge_file_names)), policy)
 
 
 def get_ppi_inputs(
-    df_human: pl.DataFrame, df_judge: pl.DataFrame, field_name: str = "both_correct"
+    calibration_index: dict[str, np.ndarray],
+    provider: str,
+    df_judge: pl.DataFrame,
+    field_name: str = "both_correct",
 ):
-    judge_field_name = field_name.replace("is_", "") + "ness"
-    df_labelled_unsampled = df_human.with_columns(
-        pl.mean_horizontal(pl.selectors.starts_with(field_name)).alias(judge_field_name)
-    )
-    distribution = df_judge.get_column(judge_field_name).value_counts()
-    n_samples = (
-        distribution.with_columns(pl.col("count").alias("n_samples"))
-        .select(judge_field_name, "n_samples")
-        .to_dicts()
+    Y, Y_hat = get_calibration_pool(calibration_index, provider, field_name)
+    # Predictions the jury could not decide on (see `JuryPolicy`) are left out.
+    Y_hat_unlabelled = (
+        df_judge.sort("custom_id")[get_judge_field_name(field_name)]
+        .drop_nulls()
+        .to_numpy()
+        .astype(float)
     )
-    sub_dfs = []
-    for elem in n_samples:
-        value, count = elem[judge_field_name], elem["n_samples"]
-        sub_dfs.append(
-            df_labelled_unsampled.filter(pl.col(judge_field_name) == value).sample(
-                count, with_replacement=True, shuffle=True
-            )
-        )
-    df_labelled = pl.concat(sub_dfs, how="vertical")
-    Y_hat_unlabelled = df_judge[judge_field_name].to_numpy().astype(float)
-    human_suffix = field_name.replace("is_", "")
-    Y = df_labelled[f"human_{human_suffix}"].to_numpy().astype(float)
-    Y_hat = df_labelled[judge_field_name].to_numpy().astype(float)
     return Y, Y_hat, Y_hat_unlabelled
 
 
-def get_ppi_results(
-    df_human: pl.DataFrame, df_judge: pl.DataFrame, field_name: str = "both_correct"
-):
-    Y, Y_hat, Y_hat_unlabelled = get_ppi_inputs(df_human, df_judge, field_name)
-    ppi_pointestimate = ppi_mean_pointestimate(Y, Y_hat, Y_hat_unlabelled)
-    return ppi_pointestimate
-
-
 def get_model_performance(
-    df_human: pl.DataFrame, df_judge: pl.DataFrame, field_name: str = "both_correct"
+    calibration_index: dict[str, np.ndarray],
+    provider: str,
+    df_judge: pl.DataFrame,
+    field_name: str = "both_correct",
+    n_boot: int = 10_000,
+    seed: int = 0,
+    bootstrap_mode: BootstrapMode = "indices",
+    adaptive: bool = False,
+    max_boot: int = 100_000,
+    target_confidence: float = 0.95,
+    method: Method = "bootstrap",
 ) -> dict[str, float]:
-    ppi_point_estimates = []
-    for _ in range(10000):
-        ppi_pointestimate = get_ppi_results(df_human, df_judge, field_name=field_name)
-        ppi_point_estimates.append(ppi_pointestimate[0])
-    ppi_ci_lower = np.percentile(ppi_point_estimates, 2.5)
-    ppi_ci_upper = np.percentile(ppi_point_estimates, 97.5)
-    spread = (ppi_ci_upper - ppi_ci_lower) / 2
-    score = (ppi_ci_upper + ppi_ci_lower) / 2
+    bootstrap = StratifiedBootstrap(
+        *get_ppi_inputs(calibration_index, provider, df_judge, field_name)
+    )
+    rng = np.random.default_rng(seed)
+    if method == "analytic":
+        score, ci = get_normal_score_and_ci(*bootstrap.normal_approximation())
+    elif adaptive:
+        point_estimates = adaptive_point_estimates(
+            lambda n: bootstrap.point_estimates(rng, n, mode=bootstrap_mode)[None, :],
+            max_boot=max_boot,
+            confidence=target_confidence,
+        )[0]
+        score, ci = get_score_and_ci(point_estimates)
+    else:
+        score, ci = get_score_and_ci(bootstrap.point_estimates(rng, n_boot, mode=bootstrap_mode))
     return {
-        "score": (score * 100).round(1).item(),
-        "95% CI (±)": (np.floor(spread * 100 * 10) + 1).item() / 10,
+        "score": score,
+        "95% CI (±)": ci,
     }
 
 
-def main(field_name: str, judge_files: list[str]):
+def main(field_name: str, judge_files: list[str], policy: JuryPolicy = "agree", **kwargs):
     provider = judge_files[0].split("_")[1]
-    if len(judge_files) != 3:
-        raise ValueError("Expected 3 judge files, got {}".format(len(judge_files)))
-    df_jury = get_jury_df(judge_files)
-    df_human = pl.read_ndjson(
-        "hf://datasets/rvienne/layton-eval-ppi/ppi_llm.jsonl", infer_schema_length=100000
-    ).filter((pl.col("human_answer_correct").is_not_null()) & (pl.col("provider") != provider))
-    return get_model_performance(df_human, df_jury, field_name=field_name)
+    # A staged jury may not have needed its third judge.
+    if len(judge_files) not in (2, 3):
+        raise ValueError("Expected 2 or 3 judge files, got {}".format(len(judge_files)))
+    df_jury = get_jury_df(judge_files, policy)
+    df_ppi = read_ppi("llm")
+    return get_model_performance(
+        load_calibration_index(df_ppi, "llm"), provider, df_jury, field_name=field_name, **kwargs
+    )
 
 
 if __name__ == "__main__":
@@ -106,6 +118,43 @@ if __name__ == "__main__":
         required=True,
         help="List of judge result files (supports shell wildcards like results/*.jsonl)",
     )
+    parser.add_argument("--n-boot", type=int, default=10_000, help="Bootstrap replicates")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--bootstrap-mode", type=str, choices=t.get_args(BootstrapMode), default="indices"
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Draw replicates until the rounded score and CI are stable, ignores --n-boot",
+    )
+    parser.add_argument("--max-boot", type=int, default=100_000, help="Cap for --adaptive")
+    parser.add_argument("--target-confidence", type=float, default=0.95)
+    parser.add_argument(
+        "--method",
+        type=str,
+        choices=t.get_args(Method),
+        default="bootstrap",
+        help="'analytic' uses the normal approximation of the bootstrap, for quick checks only",
+    )
+    parser.add_argument(
+        "--jury-policy",
+        type=str,
+        choices=t.get_args(JuryPolicy),
+        default="agree",
+        help="Jury value of predictions judged by part of the jury, see `layton_eval.jury`",
+    )
     args = parser.parse_args()
-    model_performance = main(args.field_name, args.judge_files)
+    model_performance = main(
+        args.field_name,
+        args.judge_files,
+        policy=args.jury_policy,
+        n_boot=args.n_boot,
+        seed=args.seed,
+        bootstrap_mode=args.bootstrap_mode,
+        adaptive=args.adaptive,
+        max_boot=args.max_boot,
+        target_confidence=args.target_confidence,
+        method=args.method,
+    )
     print(model_performance)
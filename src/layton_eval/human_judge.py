@@ -11,8 +11,13 @@ import random
 from collections import Counter
 from pathlib import Path
 
+import polars as pl
 import streamlit as st
 
+from layton_eval.riddle_index import get_riddle_index, get_riddles
+from layton_eval.schemas import get_schema
+from layton_eval.storage import find_jsonl_files, get_table_path, open_jsonl
+
 # Constants - paths relative to project root (two levels up from this file)
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 RESULTS_DIR = PROJECT_ROOT / "results"
@@ -32,14 +37,17 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def load_riddle_data() -> dict[str, dict]:
-    """Load layton_eval.jsonl as id -> riddle_data dict."""
-    riddles = {}
-    with open(DATASET_PATH, "r", encoding="utf-8") as f:
-        for line in f:
-            data = json.loads(line.strip())
-            riddles[data["id"]] = data
-    return riddles
+def load_riddle_data(split: str) -> dict[str, dict]:
+    """Load the riddles of `split` from layton_eval.jsonl as id -> riddle_data dict.
+
+    Images are only loaded for the VLM split, the only one displaying them.
+    """
+    index = get_riddle_index(DATASET_PATH)
+    columns = [
+        column for column in get_schema("riddle").names() if split == "vlm" or column != "img"
+    ]
+    df = get_riddles(index.filter(pl.col("split") == split)["id"], columns, DATASET_PATH)
+    return {riddle["id"]: riddle for riddle in df.iter_rows(named=True)}
 
 
 def get_split_from_filename(filename: str) -> str:
@@ -60,14 +68,16 @@ def load_predictions(pattern: str, split_filter: str | None = None) -> list[dict
     """
     predictions = []
 
-    for file_path in RESULTS_DIR.glob(pattern):
+    for file_path in find_jsonl_files(str(RESULTS_DIR / pattern)):
+        # Compressed files are named after their uncompressed name in annotations
+        file_name = get_table_path(file_path, "jsonl").name
         # Skip files that don't match the split filter
         if split_filter:
-            file_split = get_split_from_filename(file_path.name)
+            file_split = get_split_from_filename(file_name)
             if file_split != split_filter:
                 continue
 
-        with open(file_path, "r", encoding="utf-8") as f:
+        with open_jsonl(file_path) as f:
             for line in f:
                 pred = json.loads(line.strip())
                 # Parse the answer field as JSON to extract answer and justification
@@ -80,14 +90,14 @@ def load_predictions(pattern: str, split_filter: str | None = None) -> list[dict
                     pred["parsed_justification"] = ""
 
                 # Extract provider from file name (e.g., benchmark_anthropic_... -> anthropic)
-                parts = file_path.stem.split("_")
+                parts = file_name.removesuffix(".jsonl").split("_")
                 if len(parts) >= 2:
                     pred["provider"] = parts[1]
                 else:
                     pred["provider"] = "unknown"
 
-                pred["source_file"] = file_path.name
-                pred["split"] = get_split_from_filename(file_path.name)
+                pred["source_file"] = file_name
+                pred["split"] = get_split_from_filename(file_name)
                 predictions.append(pred)
 
     return predictions
@@ -116,14 +126,14 @@ def load_jury_scores() -> dict[tuple[str, str], dict]:
     """
     jury_scores: dict[tuple[str, str], dict] = {}
 
-    for file_path in RESULTS_DIR.glob("jury_*.jsonl"):
-        with open(file_path, "r", encoding="utf-8") as f:
+    for file_path in find_jsonl_files(str(RESULTS_DIR / "jury_*.jsonl")):
+        with open_jsonl(file_path) as f:
             for line in f:
                 if line.strip():
                     data = json.loads(line.strip())
                     custom_id = data.get("custom_id", "")
                     if custom_id:
-                        key = (file_path.name, custom_id)
+                        key = (get_table_path(file_path, "jsonl").name, custom_id)
                         jury_scores[key] = {
                             "answer_correctness": data.get("answer_correctness", 1.0),
                             "justification_correctness": data.get("justification_correctness", 1.0),
@@ -339,7 +349,10 @@ def display_jury_warning(
 
     if score is not None:
         just_corr = score.get("justification_correctness", 1.0)
-        if just_corr < 1.0:
+        # Staged juries leave undecided predictions null
+        if just_corr is None:
+            st.warning("⚠️ **Jury Disagreement on Justification!** Score: **undecided**")
+        elif just_corr < 1.0:
             st.warning(f"⚠️ **Jury Disagreement on Justification!** Score: **{just_corr:.0%}**")
 
 
@@ -428,7 +441,7 @@ def main():
 
         # Load data
         with st.spinner("Loading data..."):
-            riddles = load_riddle_data()
+            riddles = load_riddle_data(selected_split)
             predictions = load_predictions(args.pattern, split_filter=selected_split)
             annotations = load_annotations()
             jury_scores = load_jury_scores()
@@ -0,0 +1,181 @@
+import argparse
+import base64
+import functools
+import hashlib
+import io
+import json
+import typing as t
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import polars as pl
+from PIL import Image
+
+from layton_eval.settings import settings
+from layton_eval.storage import get_table_stem, open_jsonl, resolve_table
+
+IMAGE_STORE_DIR = settings.root_dir / "layton-data" / "image_store"
+EXPORT_DIR = settings.root_dir / "export_files"
+# Raw files point to stored images with this URL scheme instead of inlining them.
+IMAGE_REF_PREFIX = "layton-image:"
+# Quality of re-encoded images when only their size or colors change.
+DEFAULT_JPEG_QUALITY = 90
+
+
+def get_image_path(digest: str) -> Path:
+    return IMAGE_STORE_DIR / f"{digest}.jpg"
+
+
+def put_image(img: str) -> str:
+    """Store a base64 JPEG under the hash of its content, and return a reference to it."""
+    data = base64.b64decode(img)
+    digest = hashlib.sha256(data).hexdigest()
+    path = get_image_path(digest)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so that a stored image is always complete.
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+    return f"{IMAGE_REF_PREFIX}{digest}"
+
+
+def get_preprocessing_tag(
+    max_side: int | None = None, quality: int | None = None, grayscale: bool = False
+) -> str:
+    """Name of a set of preprocessing settings, empty when images are sent as they are."""
+    parts = []
+    if max_side:
+        parts.append(f"max{max_side}")
+    if quality:
+        parts.append(f"q{quality}")
+    if grayscale:
+        parts.append("gray")
+    return "_".join(parts)
+
+
+def _preprocess_image(
+    ref: str, max_side: int | None, quality: int | None, grayscale: bool
+) -> tuple[str, int, int]:
+    """Derived image of `ref`, stored next to it as `{digest}_{tag}.jpg`, and both sizes."""
+    key = ref.removeprefix(IMAGE_REF_PREFIX)
+    derived_key = f"{key}_{get_preprocessing_tag(max_side, quality, grayscale)}"
+    path, derived_path = get_image_path(key), get_image_path(derived_key)
+    if not derived_path.exists():
+        with Image.open(path) as image:
+            image = image.convert("L" if grayscale else "RGB")
+            if max_side:
+                # Only ever shrinks, keeping the aspect ratio.
+                image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=quality or DEFAULT_JPEG_QUALITY, optimize=True)
+        tmp_path = derived_path.with_suffix(".tmp")
+        tmp_path.write_bytes(buffer.getvalue())
+        tmp_path.replace(derived_path)
+    return f"{IMAGE_REF_PREFIX}{derived_key}", path.stat().st_size, derived_path.stat().st_size
+
+
+def store_images(
+    df: pl.DataFrame,
+    max_side: int | None = None,
+    quality: int | None = None,
+    grayscale: bool = False,
+    workers: int | None = None,
+) -> pl.DataFrame:
+    """Replace the base64 `img` column of riddles by references to the image store.
+
+    With preprocessing settings, references point to derived images instead, built in parallel
+    by `workers` processes (all cores by default) and cached under (image hash, settings).
+    """
+    refs = [put_image(img) if img is not None else None for img in df["img"]]
+    if get_preprocessing_tag(max_side, quality, grayscale):
+        unique_refs = sorted({ref for ref in refs if ref is not None})
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            derived = list(
+                executor.map(
+                    _preprocess_image,
+                    unique_refs,
+                    *([value] * len(unique_refs) for value in (max_side, quality, grayscale)),
+                )
+            )
+        derived = dict(zip(unique_refs, derived))
+        splits = df["split"].to_list()
+        for split in sorted({split for split, ref in zip(splits, refs) if ref is not None}):
+            split_refs = {ref for ref_split, ref in zip(splits, refs) if ref_split == split and ref}
+            original_bytes = sum(derived[ref][1] for ref in split_refs)
+            derived_bytes = sum(derived[ref][2] for ref in split_refs)
+            print(
+                f"Images of the {split} split: {original_bytes:,} -> {derived_bytes:,} bytes "
+                f"({1 - derived_bytes / original_bytes:.1%} saved)"
+            )
+        refs = [derived[ref][0] if ref is not None else None for ref in refs]
+    return df.with_columns(pl.Series("img", refs, dtype=pl.String))
+
+
+def add_preprocessing_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--max-side", type=int, help="Downscale images to this many pixels")
+    parser.add_argument("--jpeg-quality", type=int, help="Re-encode images with this quality")
+    parser.add_argument("--grayscale", action="store_true", help="Convert images to grayscale")
+    parser.add_argument("--workers", type=int, help="Processes preprocessing images")
+
+
+@functools.cache
+def get_image_data_url(ref: str) -> str:
+    """Base64 data URL of a stored image, read once per export."""
+    data = get_image_path(ref.removeprefix(IMAGE_REF_PREFIX)).read_bytes()
+    return f"data:image/jpeg;base64,{base64.b64encode(data).decode()}"
+
+
+def get_image_data_url_chars(ref: str) -> int:
+    """Characters of the data URL an image reference is exported as, from the stored size."""
+    size = get_image_path(ref.removeprefix(IMAGE_REF_PREFIX)).stat().st_size
+    return len("data:image/jpeg;base64,") + 4 * ((size + 2) // 3)
+
+
+def expand_image_refs(raw_request: dict[str, t.Any]) -> dict[str, t.Any]:
+    """Replace the image references of a raw request by the data URLs providers expect."""
+    for message in raw_request["messages"]:
+        if not isinstance(message["content"], list):
+            continue
+        for part in message["content"]:
+            if part.get("type") == "image_url" and part["image_url"]["url"].startswith(
+                IMAGE_REF_PREFIX
+            ):
+                part["image_url"]["url"] = get_image_data_url(part["image_url"]["url"])
+    return raw_request
+
+
+def export_raw_file(raw_file_path: str | Path, output_path: str | Path | None = None) -> Path:
+    """Write the batch-ready copy of a raw file, with images inlined, line by line.
+
+    The raw file may be compressed, the copy is plain JSONL for the providers. Defaults to
+    `export_files/{name}.jsonl`, which is only rewritten when older than the raw file.
+    """
+    raw_file_path = resolve_table(raw_file_path)
+    output_path = (
+        Path(output_path)
+        if output_path
+        else EXPORT_DIR / f"{get_table_stem(raw_file_path).name}.jsonl"
+    )
+    if output_path.exists() and output_path.stat().st_mtime >= raw_file_path.stat().st_mtime:
+        return output_path
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with open_jsonl(raw_file_path) as raw_file, open(tmp_path, "w") as f:
+        for line in raw_file:
+            # Text-only requests are copied as is, without being parsed.
+            if IMAGE_REF_PREFIX in line:
+                json.dump(expand_image_refs(json.loads(line)), f)
+                f.write("\n")
+            else:
+                f.write(line)
+    tmp_path.replace(output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--raw-file-path", type=str, required=True)
+    parser.add_argument("--output-path", type=str, help="Default: export_files/{raw file name}")
+    args = parser.parse_args()
+    print(export_raw_file(args.raw_file_path, args.output_path))
@@ -1,76 +1,68 @@
-import json
-
 import polars as pl
 
+from layton_eval.image_store import export_raw_file, store_images
+from layton_eval.raw_requests import (
+    get_system_prompt,
+    raw_request,
+    riddle_parts,
+    text_part,
+    with_riddle_parts,
+    write_raw_requests,
+)
+from layton_eval.riddle_index import get_riddle_index, get_riddles
+from layton_eval.schemas import get_schema
 from layton_eval.settings import settings
+from layton_eval.storage import read_table
 from layton_eval.utils import load_txt
 
 
 def generate_raw_file():
-    df_justification = pl.read_ndjson(settings.root_dir / "results" / "justification_claude.jsonl")[
-        "custom_id", "answer"
-    ]
-    df = pl.read_ndjson(settings.root_dir / "datasets" / "layton_eval.jsonl")
+    df_justification = read_table(
+        settings.root_dir / "results" / "justification_claude", schema=get_schema("batch_result")
+    )["custom_id", "answer"]
+    # Older justification batches had no id, batchling numbered them after their riddle row.
+    df_legacy_ids = get_riddle_index().select(
+        pl.format("request-{}", "index").alias("custom_id"), pl.col("id").alias("riddle_id")
+    )
+    riddle_ids = df_justification.join(
+        df_legacy_ids, on="custom_id", how="left", maintain_order="left"
+    ).select(pl.coalesce("riddle_id", "custom_id"))
+    df = get_riddles(riddle_ids.to_series()).hstack(
+        [df_justification["answer"].alias("generated_justification")]
+    )
+    unknown_ids = df.filter(pl.col("split").is_null())["id"].to_list()
+    if unknown_ids:
+        raise ValueError(f"Justifications of unknown riddles: {unknown_ids}")
+    df = store_images(df)
     image_prompt = load_txt(settings.root_dir / "prompts" / "judge" / "visual_riddle.txt")
     text_prompt = load_txt(settings.root_dir / "prompts" / "judge" / "text_riddle.txt")
-    with open(settings.root_dir / "raw_files" / "judge_openai.jsonl", "w") as f:
-        for row_justification in df_justification.iter_rows(named=True):
-            idx = int(row_justification.get("custom_id").split("-")[-1])
-            row = df[idx].to_dicts()[0]
-            raw_request = {
-                "system_prompt": "",
-                "messages": [],
-                # "max_tokens": 1000
-            }
-            content = [
-                {"type": "text", "text": f"Riddle question: {row.get('description')}"},
-            ]
-            if row.get("split") == "vlm":
-                content.append(
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{row.get('img')}"},
-                    },
-                )
-            if row.get("first_hint"):
-                content.append(
-                    {"type": "text", "text": f"First hint: {row.get('first_hint')}"},
-                )
-            if row.get("second_hint"):
-                content.append(
-                    {"type": "text", "text": f"Second hint: {row.get('second_hint')}"},
-                )
-            if row.get("third_hint"):
-                content.append(
-                    {"type": "text", "text": f"Third hint: {row.get('third_hint')}"},
-                )
-            if row.get("special_hint"):
-                content.append(
-                    {"type": "text", "text": f"Special hint: {row.get('special_hint')}"},
-                )
-            content.extend(
+    lines = (
+        with_riddle_parts(df)
+        .select(
+            raw_request(
+                get_system_prompt(image_prompt, text_prompt),
                 [
-                    {"type": "text", "text": f"Riddle answer: {row.get('answer')}"},
-                    {"type": "text", "text": f"Riddle solution: {row.get('solution')}"},
-                ]
-            )
-            content.append(
-                {
-                    "type": "text",
-                    "text": f"Generated justification: {row_justification.get('answer')}",
-                }
-            )
-            raw_request["system_prompt"] = (
-                image_prompt if row.get("split") == "vlm" else text_prompt
+                    *riddle_parts(),
+                    text_part(pl.format("Riddle answer: {}", pl.col("answer").fill_null("None"))),
+                    text_part(
+                        pl.format("Riddle solution: {}", pl.col("solution").fill_null("None"))
+                    ),
+                    text_part(
+                        pl.format(
+                            "Generated justification: {}",
+                            pl.col("generated_justification").fill_null("None"),
+                        )
+                    ),
+                ],
             )
-            raw_request["messages"] = [
-                {
-                    "role": "user",
-                    "content": content,
-                }
-            ]
-            json.dump(raw_request, f)
-            f.write("\n")
+        )
+        .to_series()
+    )
+    raw_file_path = write_raw_requests(
+        lines, settings.root_dir / "raw_files" / "judge_openai.jsonl"
+    )
+    # No batch script sends this file: export the copy with inlined images for the provider.
+    print(export_raw_file(raw_file_path))
 
 
 if __name__ == "__main__":
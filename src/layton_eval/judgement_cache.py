@@ -0,0 +1,114 @@
+import hashlib
+import typing as t
+
+import polars as pl
+
+from layton_eval.jury import get_jury_judges
+from layton_eval.schemas import get_schema, is_valid_answer
+from layton_eval.settings import settings
+from layton_eval.storage import find_tables, read_table, read_tables, write_table
+
+JUDGEMENT_CACHE_DIR = settings.root_dir / "cache" / "judgements"
+# Output of each judge model on each judge input already judged, see `get_input_hash`.
+JUDGEMENT_CACHE_PATH = JUDGEMENT_CACHE_DIR / "judgements"
+# Input hash of the requests of each raw judge file, in a table named after it.
+JUDGEMENT_KEYS_DIR = JUDGEMENT_CACHE_DIR / "keys"
+
+
+def normalize_text(expr: pl.Expr) -> pl.Expr:
+    """Text with its whitespace collapsed, which does not change what a judge reads."""
+    return expr.str.strip_chars().str.replace_all(r"\s+", " ")
+
+
+def get_input_hash(*exprs: pl.Expr) -> pl.Expr:
+    """Stable hash of the judge input made of `exprs`, telling nulls and empty strings apart."""
+    return (
+        pl.struct(*exprs)
+        .struct.json_encode()
+        .map_elements(lambda value: hashlib.sha256(value.encode()).hexdigest(), pl.String)
+    )
+
+
+def filter_valid_judgements(df: pl.DataFrame) -> pl.DataFrame:
+    """Rows of `df` whose `answer` is a valid judgement.
+
+    Failed, refused or unparsable answers are left out, so that their requests are sent again.
+    """
+    return df.filter(
+        pl.col("answer").map_elements(
+            lambda answer: is_valid_answer(answer, "benchmark_judgement"), return_dtype=pl.Boolean
+        )
+    )
+
+
+def read_judgement_cache() -> pl.DataFrame:
+    schema = get_schema("cached_judgement")
+    try:
+        # Entries cached before answers were validated may not be judgements.
+        return filter_valid_judgements(read_table(JUDGEMENT_CACHE_PATH, schema=schema))
+    except FileNotFoundError:
+        return pl.DataFrame(schema=schema)
+
+
+def update_judgement_cache(df: pl.DataFrame) -> pl.DataFrame:
+    """Add the `input_hash`, `model` and `answer` of fresh judge results to the cache.
+
+    Only valid judgements are cached, see `filter_valid_judgements`.
+    """
+    cache = read_judgement_cache()
+    df = filter_valid_judgements(df)
+    if df.is_empty():
+        return cache
+    cache = pl.concat([cache, df.select(cache.columns)]).unique(
+        ["input_hash", "model"], keep="last", maintain_order=True
+    )
+    JUDGEMENT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    write_table(cache, JUDGEMENT_CACHE_PATH)
+    return cache
+
+
+def write_judgement_keys(df: pl.DataFrame, judge_file_name: str):
+    """Record the `custom_id` and `input_hash` of the requests of a raw judge file."""
+    JUDGEMENT_KEYS_DIR.mkdir(parents=True, exist_ok=True)
+    write_table(df.select("custom_id", "input_hash"), JUDGEMENT_KEYS_DIR / judge_file_name)
+
+
+def filter_cache_misses(df: pl.DataFrame, judges: t.Sequence[str]) -> pl.DataFrame:
+    """Rows of `df` whose `input_hash` has not been judged yet by every one of `judges`."""
+    cached_judges = (
+        read_judgement_cache()
+        .filter(pl.col("model").is_in(judges))
+        .group_by("input_hash")
+        .agg(pl.col("model").n_unique().alias("cached_judges"))
+    )
+    return (
+        df.join(cached_judges, on="input_hash", how="left", maintain_order="left")
+        .filter(pl.col("cached_judges").fill_null(0) < len(judges))
+        .drop("cached_judges")
+    )
+
+
+def with_cached_judgements(df: pl.DataFrame, judge_file_names: t.Sequence[str]) -> pl.DataFrame:
+    """Judge results `df` completed with the cached outputs of the requests it lacks.
+
+    The fresh results of `df` are added to the cache first. Without keys recorded for
+    `judge_file_names` (raw files generated without the cache), `df` is returned as is.
+    """
+    key_paths = [
+        path for name in judge_file_names for path in find_tables(str(JUDGEMENT_KEYS_DIR / name))
+    ]
+    if not key_paths:
+        return df
+    keys = read_tables(key_paths, schema=get_schema("judgement_key")).unique(
+        "custom_id", keep="last", maintain_order=True
+    )
+    cache = update_judgement_cache(df.join(keys, on="custom_id"))
+    judges = {judge for name in judge_file_names for judge in get_jury_judges(name)}
+    cached = (
+        keys.join(cache.filter(pl.col("model").is_in(judges)), on="input_hash")
+        .join(df, on=["custom_id", "model"], how="anti")
+        .drop("input_hash")
+    )
+    if not cached.is_empty():
+        print(f"{len(cached)} judgements read from the cache")
+    return pl.concat([df, cached], how="diagonal_relaxed")
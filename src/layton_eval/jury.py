@@ -0,0 +1,193 @@
+import argparse
+import re
+import typing as t
+from pathlib import Path
+
+import polars as pl
+
+from layton_eval.raw_requests import filter_raw_requests
+from layton_eval.schemas import decode_answer, get_schema
+from layton_eval.settings import settings
+from layton_eval.storage import (
+    find_tables,
+    get_table_path,
+    get_table_stem,
+    read_table,
+    read_tables,
+    resolve_table,
+)
+
+# Judge model of each jury provider, as named in judge results (see `create_jury_batches.sh`).
+JURY_JUDGES = {
+    "openai": "gpt-5.1-2025-11-13",
+    "gemini": "gemini-3-pro-preview",
+    "anthropic": "claude-opus-4-5-20251101",
+    "mistral": "mistral-large-2512",
+}
+# Provider whose judge is sent the `_max_tokens` variant of raw judge files.
+MAX_TOKENS_JUDGE_PROVIDER = "anthropic"
+# Judges called last by a staged jury, only on disputed predictions: the first one in the jury.
+THIRD_JUDGE_PROVIDERS = ("anthropic", "mistral")
+JURY_FIELDS = {
+    "is_answer_correct": "answer_correctness",
+    "is_justification_correct": "justification_correctness",
+    "both_correct": "both_correctness",
+}
+# How predictions missing verdicts of some judges of the jury map to jury values:
+# - `agree`: the missing judges agree with the others when these are unanimous, otherwise the
+#   value is null (undecided),
+# - `lower` / `upper`: missing verdicts count as incorrect / correct,
+# - `drop`: the value is null.
+# Fully judged predictions get the mean of their verdicts whatever the policy.
+JuryPolicy = t.Literal["agree", "lower", "upper", "drop"]
+
+
+def get_excluded_provider(judge_file_name: str) -> str:
+    """Provider of the judged model, whose judge is left out (Mistral's for other providers)."""
+    match = re.match(r"judge_([^_]+)", judge_file_name)
+    return match.group(1) if match and match.group(1) in JURY_JUDGES else "mistral"
+
+
+def get_jury_providers(judge_file_name: str) -> list[str]:
+    """Providers of the judges `create_jury_batches.sh` sends a raw judge file to."""
+    if judge_file_name.endswith("_max_tokens"):
+        providers = [MAX_TOKENS_JUDGE_PROVIDER]
+    else:
+        providers = [provider for provider in JURY_JUDGES if provider != MAX_TOKENS_JUDGE_PROVIDER]
+    return [
+        provider for provider in providers if provider != get_excluded_provider(judge_file_name)
+    ]
+
+
+def get_jury_judges(judge_file_name: str) -> list[str]:
+    """Judge models `create_jury_batches.sh` sends a raw judge file to."""
+    return [JURY_JUDGES[provider] for provider in get_jury_providers(judge_file_name)]
+
+
+def get_jury_file_names(judge_file_name: str) -> list[str]:
+    """Raw judge files sent to the jury of a raw judge file (or of its variants)."""
+    base_name = judge_file_name.removesuffix("_max_tokens").removesuffix("_disputed")
+    return [base_name, f"{base_name}_max_tokens"]
+
+
+def get_jury_size(judge_file_name: str) -> int:
+    """Number of judges of the jury on the predictions of a raw judge file (or its variants)."""
+    return sum(len(get_jury_judges(name)) for name in get_jury_file_names(judge_file_name))
+
+
+def get_third_judge_provider(judge_file_name: str) -> str:
+    """Provider of the judge a staged jury only calls on disputed predictions."""
+    excluded_provider = get_excluded_provider(judge_file_name)
+    return next(provider for provider in THIRD_JUDGE_PROVIDERS if provider != excluded_provider)
+
+
+def get_disputed_file_name(judge_file_name: str) -> str:
+    """Raw file of the third judge of a staged jury, which keeps the jury results glob prefix."""
+    base_name = judge_file_name.removesuffix("_max_tokens")
+    if get_third_judge_provider(judge_file_name) == MAX_TOKENS_JUDGE_PROVIDER:
+        return f"{base_name}_disputed_max_tokens"
+    return f"{base_name}_disputed"
+
+
+def get_verdicts(df: pl.DataFrame) -> pl.DataFrame:
+    """Decode the verdicts of judge results, `both_correct` included."""
+    return df.with_columns(decode_answer("benchmark_judgement").struct.unnest()).with_columns(
+        pl.col("is_answer_correct").and_(pl.col("is_justification_correct")).alias("both_correct")
+    )
+
+
+def get_jury_value(field: str, jury_size: int, policy: JuryPolicy = "agree") -> pl.Expr:
+    """Aggregation of the verdicts on `field` of a prediction into its jury value."""
+    verdicts = pl.col(field)
+    judged, positives = verdicts.count(), verdicts.sum()
+    is_complete = judged >= jury_size
+    if policy == "agree":
+        value = pl.when(is_complete | (verdicts.drop_nulls().n_unique() == 1)).then(verdicts.mean())
+    elif policy == "lower":
+        value = pl.when(is_complete).then(verdicts.mean()).otherwise(positives / jury_size)
+    elif policy == "upper":
+        value = (
+            pl.when(is_complete)
+            .then(verdicts.mean())
+            .otherwise((positives + jury_size - judged) / jury_size)
+        )
+    else:
+        value = pl.when(is_complete).then(verdicts.mean())
+    return value.alias(JURY_FIELDS[field])
+
+
+def aggregate_jury(df: pl.DataFrame, jury_size: int, policy: JuryPolicy = "agree") -> pl.DataFrame:
+    """Jury values of each `custom_id` from the decoded verdicts of its judges.
+
+    Predictions may have been judged by part of the jury only (staged jury, failed requests),
+    see `JuryPolicy`.
+    """
+    return df.group_by("custom_id").agg(
+        get_jury_value(field, jury_size, policy) for field in JURY_FIELDS
+    )
+
+
+def get_disputed_ids(df: pl.DataFrame, ids: pl.Series) -> pl.Series:
+    """`ids` on which the judges of `df` disagree, or that fewer than two judges answered.
+
+    Predictions no judge answered are disputed too, so that none drops out of the jury.
+    """
+    verdicts = [
+        pl.col(field).drop_nulls() for field in ("is_answer_correct", "is_justification_correct")
+    ]
+    is_disputed = df.group_by("custom_id").agg(
+        (
+            (pl.min_horizontal(verdict.len() for verdict in verdicts) < 2)
+            | pl.any_horizontal(verdict.n_unique() > 1 for verdict in verdicts)
+        ).alias("is_disputed")
+    )
+    return (
+        ids.alias("custom_id")
+        .to_frame()
+        .join(is_disputed, on="custom_id", how="left", maintain_order="left")
+        .filter(pl.col("is_disputed").fill_null(True))["custom_id"]
+    )
+
+
+def write_disputed_raw_file(
+    raw_file_path: str | Path, results_dir: str | Path = settings.root_dir / "results"
+) -> Path | None:
+    """Raw file of the third judge of a staged jury, with only the disputed predictions.
+
+    The first two judges' results on the requests of `raw_file_path` are read from
+    `results_dir`. Returns `None` when they agree on every prediction.
+    """
+    judge_file_name = get_table_stem(raw_file_path).name
+    ids = read_table(raw_file_path, schema=pl.Schema({"id": pl.String}))["id"]
+    df = get_verdicts(
+        read_tables(
+            find_tables(str(Path(results_dir) / f"{judge_file_name}_by_*")),
+            schema=get_schema("batch_result"),
+        )
+    )
+    disputed_ids = set(get_disputed_ids(df, ids))
+    print(f"{len(disputed_ids)} of {len(ids)} predictions disputed")
+    if not disputed_ids:
+        return None
+    if get_third_judge_provider(judge_file_name) == MAX_TOKENS_JUDGE_PROVIDER:
+        raw_file_path = get_table_path(raw_file_path, "jsonl").with_name(
+            f"{judge_file_name}_max_tokens.jsonl"
+        )
+    raw_file_path = resolve_table(raw_file_path)
+    output_path = raw_file_path.with_name(
+        raw_file_path.name.replace(
+            get_table_stem(raw_file_path).name, get_disputed_file_name(judge_file_name), 1
+        )
+    )
+    filter_raw_requests(raw_file_path, disputed_ids, output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--raw-file-path", type=str, required=True, help="Raw judge file")
+    parser.add_argument("--results-dir", type=str, default=str(settings.root_dir / "results"))
+    args = parser.parse_args()
+    output_path = write_disputed_raw_file(args.raw_file_path, args.results_dir)
+    if output_path is not None:
+        print(output_path)
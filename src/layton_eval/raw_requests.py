@@ -0,0 +1,153 @@
+import json
+import typing as t
+from pathlib import Path
+
+import polars as pl
+
+from layton_eval.settings import settings
+from layton_eval.storage import get_table_path, open_jsonl
+
+# Request parts are built as JSON fragments with polars expressions, then concatenated into
+# one JSON line per request: no Python object is built or serialized per row.
+
+HINT_FIELDS = ("first_hint", "second_hint", "third_hint", "special_hint")
+HINT_LABELS = ("First hint", "Second hint", "Third hint", "Special hint")
+
+
+def json_value(expr: pl.Expr) -> pl.Expr:
+    """JSON encoding of the values of `expr` (strings are quoted and escaped)."""
+    # `{"v":...}` is the only struct encoding polars offers, keep what follows the key.
+    encoded = pl.struct(expr.alias("v")).struct.json_encode()
+    return encoded.str.slice(5, encoded.str.len_chars() - 6)
+
+
+def json_literal(value: t.Any) -> pl.Expr:
+    """JSON encoding of a value shared by every row, encoded once."""
+    return pl.lit(json.dumps(value))
+
+
+def text_part(text: pl.Expr) -> pl.Expr:
+    """Text content part, null (hence skipped) when `text` is."""
+    # `json_value` encodes nulls as the JSON `null`, which would make a part of them.
+    return pl.when(text.is_not_null()).then(
+        pl.concat_str(pl.lit('{"type": "text", "text": '), json_value(text), pl.lit("}"))
+    )
+
+
+def optional_text_part(label: str, column: str) -> pl.Expr:
+    """`{label}: {value}` text part, skipped when the value is null or empty."""
+    return (
+        pl.when(pl.col(column).str.len_chars() > 0)
+        .then(text_part(pl.format(f"{label}: {{}}", pl.col(column))))
+        .otherwise(None)
+    )
+
+
+def image_part(url: pl.Expr) -> pl.Expr:
+    """Image content part, null (hence skipped) when `url` is."""
+    return pl.when(url.is_not_null()).then(
+        pl.concat_str(
+            pl.lit('{"type": "image_url", "image_url": {"url": '), json_value(url), pl.lit("}}")
+        )
+    )
+
+
+def get_system_prompt(image_prompt: str, text_prompt: str) -> pl.Expr:
+    """Prompt of VLM riddles or of text riddles, depending on their split."""
+    return (
+        pl.when(pl.col("split") == "vlm")
+        .then(json_literal(image_prompt))
+        .otherwise(json_literal(text_prompt))
+    )
+
+
+def with_riddle_parts(df: pl.DataFrame) -> pl.DataFrame:
+    """Add the parts of riddle requests: question, image (VLM riddles only) and hints.
+
+    They are `{name}_part` columns, encoded once however many variants of requests use them.
+    """
+    if "img" in df.columns:
+        image = pl.when(pl.col("split") == "vlm").then(image_part(pl.col("img")))
+    else:
+        image = pl.lit(None, dtype=pl.String)
+    return df.with_columns(
+        text_part(pl.format("Riddle question: {}", pl.col("description"))).alias("question_part"),
+        image.alias("image_part"),
+        *[
+            optional_text_part(label, field).alias(f"{field}_part")
+            for field, label in zip(HINT_FIELDS, HINT_LABELS)
+        ],
+    )
+
+
+def riddle_parts(hints: int = len(HINT_FIELDS)) -> list[pl.Expr]:
+    """Question, image and first `hints` hints of `with_riddle_parts`, in request order."""
+    return [
+        pl.col("question_part"),
+        pl.col("image_part"),
+        *[pl.col(f"{field}_part") for field in HINT_FIELDS[:hints]],
+    ]
+
+
+def raw_request(
+    system_prompt: pl.Expr,
+    content: t.Sequence[pl.Expr],
+    request_id: pl.Expr | None = None,
+    max_tokens: int | None = None,
+) -> pl.Expr:
+    """JSON line of a raw request, from JSON fragments (see `json_value` and `*_part`).
+
+    Null content parts are dropped, the other ones are kept in order.
+    """
+    fragments = []
+    if request_id is not None:
+        fragments += [pl.lit('{"id": '), json_value(request_id), pl.lit(', "system_prompt": ')]
+    else:
+        fragments.append(pl.lit('{"system_prompt": '))
+    fragments += [
+        system_prompt,
+        pl.lit(', "messages": [{"role": "user", "content": ['),
+        pl.concat_list([part.cast(pl.String) for part in content])
+        .list.drop_nulls()
+        .list.join(", "),
+        pl.lit("]}]"),
+    ]
+    if max_tokens:
+        fragments.append(pl.lit(f', "max_tokens": {max_tokens}'))
+    fragments.append(pl.lit("}"))
+    return pl.concat_str(fragments)
+
+
+def write_raw_requests(lines: pl.Series, file_path: str | Path) -> Path:
+    """Write request lines, already valid JSON and written unquoted, and return the path.
+
+    The file is written as `settings.raw_file_format`, compressed ones slice by slice.
+    """
+    file_path = get_table_path(file_path, settings.raw_file_format)
+    if settings.raw_file_format == "jsonl":
+        lines.to_frame().write_csv(file_path, include_header=False, quote_style="never")
+        return file_path
+    with open_jsonl(file_path, "w") as f:
+        for frame in lines.to_frame().iter_slices():
+            f.write(frame.write_csv(include_header=False, quote_style="never"))
+    return file_path
+
+
+def filter_raw_requests(
+    raw_file_path: str | Path, ids: t.Collection[str], output_path: str | Path
+) -> int:
+    """Copy the requests of `ids` to `output_path`, line by line, and return their number."""
+    written = 0
+    with open_jsonl(raw_file_path) as raw_file, open_jsonl(output_path, "w") as f:
+        for line in raw_file:
+            if json.loads(line)["id"] in ids:
+                f.write(line)
+                written += 1
+    return written
+
+
+def get_total_chars(*columns: str) -> pl.Expr:
+    """Characters of text `columns` summed over all rows, nulls counting for nothing."""
+    return pl.sum_horizontal(
+        pl.col(column).str.len_chars().fill_null(0) for column in columns
+    ).sum()
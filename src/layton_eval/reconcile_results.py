@@ -0,0 +1,207 @@
+import argparse
+import typing as t
+from pathlib import Path
+
+import polars as pl
+
+from layton_eval.raw_requests import filter_raw_requests
+from layton_eval.schemas import get_schema, is_valid_answer
+from layton_eval.storage import (
+    get_table_path,
+    get_table_stem,
+    read_table,
+    read_tables,
+    replace_durably,
+    resolve_table,
+    write_table,
+)
+
+# Status of the result of a request, best first: a request answered several times keeps its best.
+# `errored` results have no answer, `unparsable` ones an answer that does not fit its schema.
+ResultStatus = t.Literal["ok", "unparsable", "errored", "missing"]
+RESULT_STATUSES: tuple[ResultStatus, ...] = t.get_args(ResultStatus)
+# Retry raw files are named `retry_{raw file}`: their results do not match the `benchmark_*` and
+# `judge_*` globs of the pipelines before they are merged back.
+RETRY_PREFIX = "retry_"
+AnswerSchema = t.Literal["benchmark_answer", "benchmark_judgement", "justification_judgement"]
+
+
+def get_answer_schema(file_name: str) -> AnswerSchema:
+    """Schema of the answers to the requests of a raw (or results) file, from its name."""
+    file_name = file_name.removeprefix(RETRY_PREFIX)
+    if file_name.startswith("benchmark_"):
+        return "benchmark_answer"
+    if file_name.startswith("judge_"):
+        return "benchmark_judgement"
+    raise ValueError(f"Cannot tell the answer schema of {file_name}, pass it explicitly")
+
+
+def with_result_status(df: pl.DataFrame, answer_schema: AnswerSchema) -> pl.DataFrame:
+    """Add the `status` of each result of `df`, and its `status_rank` in `RESULT_STATUSES`."""
+    answer = pl.col("answer").cast(pl.String)
+    return df.with_columns(
+        pl.when(answer.is_null() | (answer.str.strip_chars() == ""))
+        .then(pl.lit("errored"))
+        .when(
+            answer.map_elements(
+                lambda value: is_valid_answer(value, answer_schema), return_dtype=pl.Boolean
+            )
+        )
+        .then(pl.lit("ok"))
+        .otherwise(pl.lit("unparsable"))
+        .alias("status")
+    ).with_columns(
+        pl.col("status")
+        .replace_strict(RESULT_STATUSES, range(len(RESULT_STATUSES)), return_dtype=pl.Int64)
+        .alias("status_rank")
+    )
+
+
+def print_status_counts(df: pl.DataFrame):
+    counts = dict(df["status"].value_counts().iter_rows())
+    print(", ".join(f"{counts.get(status, 0)} {status}" for status in RESULT_STATUSES))
+
+
+def classify_requests(
+    raw_file_path: str | Path,
+    results_file_paths: t.Sequence[str | Path],
+    answer_schema: AnswerSchema | None = None,
+) -> pl.DataFrame:
+    """`custom_id` and best result `status` of every request of a raw file, in file order."""
+    raw_file_path = resolve_table(raw_file_path)
+    answer_schema = answer_schema or get_answer_schema(get_table_stem(raw_file_path).name)
+    ids = read_table(raw_file_path, schema=pl.Schema({"id": pl.String}))["id"]
+    if ids.null_count():
+        raise ValueError(f"Requests of {raw_file_path} have no id to match results against")
+    results = (
+        with_result_status(
+            read_tables(
+                [resolve_table(path) for path in results_file_paths],
+                schema=get_schema("batch_result"),
+            ),
+            answer_schema,
+        )
+        .group_by("custom_id")
+        .agg(pl.col("status_rank").min())
+    )
+    return (
+        ids.alias("custom_id")
+        .to_frame()
+        .join(results, on="custom_id", how="left", maintain_order="left")
+        .select(
+            "custom_id",
+            pl.col("status_rank")
+            .fill_null(RESULT_STATUSES.index("missing"))
+            .replace_strict(range(len(RESULT_STATUSES)), RESULT_STATUSES, return_dtype=pl.String)
+            .alias("status"),
+        )
+    )
+
+
+def write_retry_raw_file(
+    raw_file_path: str | Path,
+    results_file_paths: t.Sequence[str | Path],
+    answer_schema: AnswerSchema | None = None,
+) -> Path | None:
+    """Raw file of the requests of `raw_file_path` without a usable result, next to it.
+
+    Returns `None` when every request has one.
+    """
+    df = classify_requests(raw_file_path, results_file_paths, answer_schema)
+    print_status_counts(df)
+    retry_ids = set(df.filter(pl.col("status") != "ok")["custom_id"])
+    if not retry_ids:
+        return None
+    raw_file_path = resolve_table(raw_file_path)
+    output_path = raw_file_path.with_name(f"{RETRY_PREFIX}{raw_file_path.name}")
+    filter_raw_requests(raw_file_path, retry_ids, output_path)
+    return output_path
+
+
+def merge_results(
+    results_file_paths: t.Sequence[str | Path],
+    retry_results_file_paths: t.Sequence[str | Path],
+    output_path: str | Path | None = None,
+    answer_schema: AnswerSchema | None = None,
+) -> Path:
+    """Merge the results of retry batches into a single results file, one row per request.
+
+    Each request keeps its best result, the latest one among equally good ones, in the order
+    of its first result. The output defaults to the first of `results_file_paths`, rewritten in
+    its format. It is written to a temporary file synced to disk and renamed over it, so that a
+    crash does not lose the results it replaces.
+    """
+    paths = [resolve_table(path) for path in [*results_file_paths, *retry_results_file_paths]]
+    answer_schema = answer_schema or get_answer_schema(get_table_stem(paths[0]).name)
+    # Results files may carry more columns than `batch_result` (usage, errors): keep them all.
+    df = with_result_status(
+        pl.concat(
+            [
+                read_table(path).with_columns(pl.lit(file_index).alias("file_index"))
+                for file_index, path in enumerate(paths)
+            ],
+            how="diagonal_relaxed",
+        ),
+        answer_schema,
+    ).with_row_index("row_index")
+    df = (
+        df.with_columns(pl.col("row_index").min().over("custom_id").alias("first_row_index"))
+        .sort(["status_rank", "file_index"], descending=[False, True], maintain_order=True)
+        .unique("custom_id", keep="first", maintain_order=True)
+        .sort("first_row_index")
+    )
+    print_status_counts(df)
+    output_path = Path(output_path) if output_path is not None else paths[0]
+    stem = get_table_stem(output_path)
+    table_format = (
+        output_path.name.removeprefix(f"{stem.name}.") if output_path != stem else "jsonl"
+    )
+    # Hidden, so that the `benchmark_*`/`judge_*` globs never read a leftover temporary file.
+    tmp_path = get_table_path(stem.with_name(f".merging_{stem.name}"), table_format)
+    try:
+        write_table(
+            df.drop("row_index", "file_index", "first_row_index", "status", "status_rank"),
+            tmp_path,
+            table_format,
+        )
+        return replace_durably(tmp_path, get_table_path(stem, table_format))
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--answer-schema",
+        type=str,
+        choices=t.get_args(AnswerSchema),
+        help="Schema of the answers, guessed from the file names by default",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    retry_parser = subparsers.add_parser(
+        "retry", help="Write the raw file of the requests without a usable result"
+    )
+    retry_parser.add_argument("--raw-file-path", type=str, required=True)
+    retry_parser.add_argument("--results-file-path", type=str, nargs="+", required=True)
+    merge_parser = subparsers.add_parser(
+        "merge", help="Merge retry results into one results file, one row per request"
+    )
+    merge_parser.add_argument("--results-file-path", type=str, nargs="+", required=True)
+    merge_parser.add_argument("--retry-results-file-path", type=str, nargs="+", required=True)
+    merge_parser.add_argument(
+        "--output-path", type=str, help="Merged results file, the first results file by default"
+    )
+    args = parser.parse_args()
+    if args.command == "retry":
+        output_path = write_retry_raw_file(
+            args.raw_file_path, args.results_file_path, args.answer_schema
+        )
+    else:
+        output_path = merge_results(
+            args.results_file_path,
+            args.retry_results_file_path,
+            args.output_path,
+            args.answer_schema,
+        )
+    if output_path is not None:
+        print(output_path)
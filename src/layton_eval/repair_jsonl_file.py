@@ -1,20 +1,98 @@
 import argparse
+import itertools
 import json
+import typing as t
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+
 from json_repair import repair_json
 
-def repair_jsonl_file(file_path: str):
-    with open(file_path, "r") as f:
-        repaired_lines = []
-        for line in f:
-            d = json.loads(line)
-            d["answer"] = repair_json(d["answer"])
-            repaired_lines.append(json.dumps(d))
-    with open(file_path, "w") as f:
-        for line in repaired_lines:
-            f.write(line + "\n")
+from layton_eval.storage import find_jsonl_files, open_jsonl, replace_durably
+
+# Lines read, and repaired in parallel, at a time: memory stays flat whatever the file size.
+CHUNK_LINES = 10_000
+
+
+def is_valid_json(answer: t.Any) -> bool:
+    """Whether `answer` is the text of a JSON value (answers that are not text never are)."""
+    try:
+        json.loads(answer)
+    except (json.JSONDecodeError, TypeError):
+        return False
+    return True
+
+
+def repair_jsonl_file(file_path: str | Path, executor: Executor | None = None) -> dict[str, int]:
+    """Repair the invalid JSON `answer`s of a results file in place, and return counts of lines.
+
+    Answers are parsed strictly first, only the invalid ones are repaired, by `executor` when
+    given. The file is written to a temporary file next to it, synced to disk and renamed over
+    it: a crash leaves it untouched. It is not rewritten when no answer could be repaired.
+    """
+    path = Path(file_path)
+    # Hidden, so that the `benchmark_*`/`judge_*` globs never read a leftover temporary file.
+    tmp_path = path.with_name(f".repairing_{path.name}")
+    stats = {"lines": 0, "without_answer": 0, "valid": 0, "repaired": 0, "unrecoverable": 0}
+    try:
+        with open_jsonl(path) as f, open_jsonl(tmp_path, "w") as tmp_file:
+            while chunk := list(itertools.islice(f, CHUNK_LINES)):
+                rows = [json.loads(line) for line in chunk]
+                invalid = [
+                    index
+                    for index, row in enumerate(rows)
+                    if row.get("answer") is not None and not is_valid_json(row["answer"])
+                ]
+                # Answers that are not text (e.g. a JSON object) cannot be repaired: keep them.
+                stats["unrecoverable"] += sum(
+                    not isinstance(rows[index]["answer"], str) for index in invalid
+                )
+                invalid = [index for index in invalid if isinstance(rows[index]["answer"], str)]
+                answers = [rows[index]["answer"] for index in invalid]
+                repaired = (executor.map if executor else map)(repair_json, answers)
+                for index, answer in zip(invalid, repaired):
+                    # Nothing could be rescued: keep the original answer, to be retried.
+                    if not answer:
+                        stats["unrecoverable"] += 1
+                        continue
+                    rows[index]["answer"] = answer
+                    chunk[index] = json.dumps(rows[index]) + "\n"
+                    stats["repaired"] += 1
+                stats["lines"] += len(rows)
+                stats["without_answer"] += sum(row.get("answer") is None for row in rows)
+                tmp_file.writelines(line if line.endswith("\n") else f"{line}\n" for line in chunk)
+        stats["valid"] = (
+            stats["lines"] - stats["without_answer"] - stats["repaired"] - stats["unrecoverable"]
+        )
+        if stats["repaired"]:
+            replace_durably(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return stats
+
+
+def find_files(patterns: list[str]) -> list[Path]:
+    """JSONL files (compressed or not) of paths or glob `patterns`, each once."""
+    paths = []
+    for pattern in patterns:
+        matches = find_jsonl_files(pattern.removesuffix(".zst"))
+        if not matches:
+            print(f"No JSONL file matches {pattern}")
+        paths += [path for path in matches if path not in paths]
+    return paths
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--file-path", type=str, required=True)
+    parser.add_argument(
+        "--file-path", type=str, nargs="+", required=True, help="Results files, or glob patterns"
+    )
+    parser.add_argument("--workers", type=int, help="Processes repairing answers")
     args = parser.parse_args()
-    repair_jsonl_file(args.file_path)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for path in find_files(args.file_path):
+            stats = repair_jsonl_file(path, executor)
+            print(
+                f"{path}: {stats['repaired']} of {stats['lines']} answers repaired, "
+                f"{stats['unrecoverable']} unrecoverable, {stats['valid']} already valid, "
+                f"{stats['without_answer']} without answer"
+            )
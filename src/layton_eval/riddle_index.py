@@ -0,0 +1,52 @@
+import functools
+import typing as t
+from pathlib import Path
+
+import polars as pl
+
+from layton_eval.schemas import get_schema
+from layton_eval.settings import settings
+from layton_eval.storage import resolve_table, scan_table
+
+DATASET_PATH = settings.root_dir / "datasets" / "layton_eval"
+
+
+@functools.cache
+def _load_riddle_index(path: Path, mtime: float) -> pl.DataFrame:
+    return (
+        scan_table(path, schema=get_schema("riddle"))
+        .select("id", "split")
+        .collect()
+        .with_row_index("index")
+    )
+
+
+def get_riddle_index(path: str | Path = DATASET_PATH) -> pl.DataFrame:
+    """`index` (row), `id` and `split` of every riddle of a dataset table.
+
+    Built once per version of the table, only its `id` and `split` columns are read.
+    """
+    path = resolve_table(path)
+    return _load_riddle_index(path, path.stat().st_mtime)
+
+
+def get_riddles(
+    ids: t.Sequence[str] | pl.Series,
+    columns: t.Sequence[str] | None = None,
+    path: str | Path = DATASET_PATH,
+) -> pl.DataFrame:
+    """Riddles of `ids`, in the same order, with only `columns` read from the dataset.
+
+    Unknown ids give rows of nulls, with their `id` kept.
+    """
+    rows = (
+        pl.DataFrame({"id": ids}, schema={"id": pl.String})
+        .join(get_riddle_index(path), on="id", how="left", maintain_order="left")
+        .get_column("index")
+    )
+    schema = get_schema("riddle")
+    columns = [column for column in columns or schema.names() if column != "id"]
+    df = scan_table(path, schema=schema).select(columns).collect()
+    return pl.DataFrame({"id": ids}, schema={"id": pl.String}).hstack(
+        df.select(pl.all().gather(rows))
+    )
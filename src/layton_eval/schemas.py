@@ -0,0 +1,192 @@
+import types
+import typing as t
+
+import polars as pl
+from pydantic import BaseModel, Field, ValidationError
+
+from layton_eval.benchmark.export_schema import BenchmarkAnswer
+from layton_eval.benchmark_judge.export_schema import BenchmarkJudgement
+from layton_eval.judge_justification.export_schema import JustificationJudgement
+
+# Judges whose verdicts are columns of the PPI tables, see `build_ppi_dataset`.
+PPI_JUDGES = (
+    "mistral-large-2512",
+    "claude-opus-4-5-20251101",
+    "gpt-5.1-2025-11-13",
+    "gemini-3-pro-preview",
+)
+PPI_JUDGEMENT_FIELDS = ("is_answer_correct", "is_justification_correct", "both_correct")
+
+_POLARS_DTYPES = {str: pl.String, bool: pl.Boolean, int: pl.Int64, float: pl.Float64}
+
+
+class Riddle(BaseModel):
+    """Row of the layton-eval riddle datasets (only the columns the pipelines use)."""
+
+    id: str
+    split: str
+    url: str | None = None
+    description: str
+    first_hint: str | None = None
+    second_hint: str | None = None
+    third_hint: str | None = None
+    special_hint: str | None = None
+    answer: str | None = None
+    solution: str | None = None
+    justification: str | None = None
+    img: str | None = None
+
+
+class BatchResult(BaseModel):
+    """Row of a batch results file, `answer` holds the JSON output of the model."""
+
+    id: str | None = None
+    custom_id: str
+    model: str | None = None
+    answer: str | None = None
+
+
+class JuryResult(BaseModel):
+    """Row of a `jury_*` file: share of judges that found the prediction correct.
+
+    Null when part of the jury disagreed and the others did not judge, see `JuryPolicy`.
+    """
+
+    custom_id: str
+    answer_correctness: float | None = None
+    justification_correctness: float | None = None
+    both_correctness: float | None = None
+
+
+class JudgementKey(BaseModel):
+    """Row of the `cache/judgements/keys` tables: hash of the input of each judge request."""
+
+    custom_id: str
+    input_hash: str
+
+
+class CachedJudgement(BaseModel):
+    """Row of the judgement cache: output of a judge `model` on the input of `input_hash`."""
+
+    input_hash: str
+    model: str
+    answer: str | None = None
+
+
+class Annotation(BaseModel):
+    """Row of the `annotations/{split}.jsonl` human labels."""
+
+    riddle_id: str
+    source_file: str
+    model: str
+    provider: str
+    custom_id: str
+    is_answer_correct: bool
+    is_justification_correct: bool
+    notes: str | None = None
+
+
+class LeaderboardRow(BaseModel):
+    """Row of the `benchmark_results/results_{split}.jsonl` leaderboards."""
+
+    rank: int
+    rank_spread: str
+    model: str
+    score: float
+    ci: float = Field(alias="95% CI (±)")
+    provider: str
+
+
+class PPIRow(BaseModel):
+    """Row of the `ppi_{split}` tables, judge verdicts excluded (see `get_ppi_schema`)."""
+
+    riddle_id: str
+    provider: str
+    model: str
+    n_hints: int
+    answer: str | None = None
+    justification: str | None = None
+    human_answer_correct: bool | None = None
+    human_justification_correct: bool | None = None
+    human_both_correct: bool | None = None
+
+
+def get_polars_dtype(annotation: t.Any) -> pl.DataType:
+    """Polars dtype of a pydantic field annotation (optional fields are nullable anyway)."""
+    if isinstance(annotation, types.UnionType) or t.get_origin(annotation) is t.Union:
+        (annotation,) = [arg for arg in t.get_args(annotation) if arg is not type(None)]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return pl.Struct(get_polars_schema(annotation))
+    if t.get_origin(annotation) is list:
+        return pl.List(get_polars_dtype(t.get_args(annotation)[0]))
+    return _POLARS_DTYPES[annotation]
+
+
+def get_polars_schema(model: type[BaseModel]) -> pl.Schema:
+    return pl.Schema(
+        {
+            field.alias or name: get_polars_dtype(field.annotation)
+            for name, field in model.model_fields.items()
+        }
+    )
+
+
+def _get_ppi_schema() -> pl.Schema:
+    schema = get_polars_schema(PPIRow)
+    columns = list(schema.items())
+    judge_columns = [
+        (f"{field_name}_{judge}", pl.Boolean)
+        for field_name in PPI_JUDGEMENT_FIELDS
+        for judge in PPI_JUDGES
+    ]
+    # Same column order as `build_ppi_dataset` outputs.
+    return pl.Schema(columns[:6] + judge_columns + columns[6:])
+
+
+SchemaName = t.Literal[
+    "riddle",
+    "batch_result",
+    "jury_result",
+    "judgement_key",
+    "cached_judgement",
+    "annotation",
+    "leaderboard",
+    "ppi",
+    "benchmark_answer",
+    "benchmark_judgement",
+    "justification_judgement",
+]
+SCHEMA_MODELS: dict[SchemaName, type[BaseModel]] = {
+    "riddle": Riddle,
+    "batch_result": BatchResult,
+    "jury_result": JuryResult,
+    "judgement_key": JudgementKey,
+    "cached_judgement": CachedJudgement,
+    "annotation": Annotation,
+    "leaderboard": LeaderboardRow,
+    "ppi": PPIRow,
+    "benchmark_answer": BenchmarkAnswer,
+    "benchmark_judgement": BenchmarkJudgement,
+    "justification_judgement": JustificationJudgement,
+}
+
+
+def get_schema(name: SchemaName) -> pl.Schema:
+    """Polars schema of an artifact, derived from its pydantic model."""
+    if name == "ppi":
+        return _get_ppi_schema()
+    return get_polars_schema(SCHEMA_MODELS[name])
+
+
+def decode_answer(name: SchemaName, column: str = "answer") -> pl.Expr:
+    """Parse the JSON structured output stored in `column` into a struct of schema `name`."""
+    return pl.col(column).str.json_decode(dtype=pl.Struct(get_schema(name)))
+
+
+def is_valid_answer(answer: str, name: SchemaName) -> bool:
+    """Whether a JSON structured output is valid for the pydantic model of schema `name`."""
+    try:
+        SCHEMA_MODELS[name].model_validate_json(answer)
+    except ValidationError:
+        return False
+    return True
@@ -0,0 +1,52 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from layton_eval.calibration_index import get_calibration_pool
+from layton_eval.settings import settings
+
+SCORE_CACHE_DIR = settings.root_dir / "cache" / "scores"
+
+
+def get_model_hash(
+    ppi_arrays: dict[str, np.ndarray],
+    calibration_index: dict[str, np.ndarray],
+    provider: str,
+    model: str,
+    n_hints: int,
+    **scoring_kwargs,
+) -> str:
+    """Content hash of everything the replicates of one model depend on.
+
+    That is the model key (which seeds its random stream), its jury values, the calibration pool
+    it is scored against and the scoring settings (`field_names`, `seed`, `n_boot`, ...).
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([provider, model, n_hints, scoring_kwargs], sort_keys=True).encode())
+    is_unlabelled = (ppi_arrays["model"] == model) & (ppi_arrays["n_hints"] == n_hints)
+    for field_name in scoring_kwargs["field_names"]:
+        Y, Y_hat = get_calibration_pool(calibration_index, provider, field_name)
+        for array in (Y, Y_hat, ppi_arrays[f"Y_hat/{field_name}"][is_unlabelled]):
+            digest.update(np.ascontiguousarray(array, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def get_score_cache_path(*args, **kwargs) -> Path:
+    """Replicates file of one model, see `get_model_hash` for arguments."""
+    return SCORE_CACHE_DIR / f"{get_model_hash(*args, **kwargs)[:16]}.npy"
+
+
+def load_point_estimates(path: Path) -> np.ndarray | None:
+    if not path.exists():
+        return None
+    return np.load(path)
+
+
+def save_point_estimates(path: Path, point_estimates: np.ndarray):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so an interrupted run never leaves a truncated entry behind.
+    tmp_path = path.with_suffix(".tmp.npy")
+    np.save(tmp_path, point_estimates)
+    tmp_path.replace(path)
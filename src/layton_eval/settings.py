@@ -1,4 +1,5 @@
 import os
+import typing as t
 from pathlib import Path
 
 from pydantic_settings import (
@@ -9,6 +10,14 @@ from pydantic_settings import (
 
 class Settings(BaseSettings):
     root_dir: Path = Path(__file__).resolve().parent.parent.parent
+    # Hub access of `layton_eval.dataset_cache`, `hf_hub_dir` replaces the hub by a local folder.
+    hf_endpoint: str = "https://huggingface.co"
+    hf_token: str | None = None
+    hf_hub_offline: bool = False
+    hf_hub_dir: Path | None = None
+    # Format of the raw files written by the generators, and zstd level of compressed tables.
+    raw_file_format: t.Literal["jsonl", "jsonl.zst"] = "jsonl"
+    zstd_level: int = 3
     model_config = SettingsConfigDict(env_file=os.path.join(root_dir, ".env"), extra="allow")
 
 
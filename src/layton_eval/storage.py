@@ -0,0 +1,221 @@
+import glob
+import io
+import itertools
+import json
+import os
+import typing as t
+from pathlib import Path
+
+import polars as pl
+import zstandard
+
+from layton_eval.settings import settings
+
+TableFormat = t.Literal["jsonl", "jsonl.zst", "arrow", "parquet"]
+# Columnar formats come first: they are preferred over a JSONL file of the same name.
+TABLE_FORMATS: tuple[TableFormat, ...] = ("arrow", "parquet", "jsonl", "jsonl.zst")
+# Row formats, the ones edited by hand or appended to line by line.
+JSONL_FORMATS: tuple[TableFormat, ...] = ("jsonl", "jsonl.zst")
+# Lines of a compressed JSONL file decompressed, and parsed, at a time.
+JSONL_CHUNK_LINES = 100_000
+
+
+def get_table_stem(path: str | Path) -> Path:
+    """`path` without its table format suffix (names may contain dots, e.g. `gpt-5.1`)."""
+    path = Path(path)
+    for table_format in TABLE_FORMATS:
+        if path.name.endswith(f".{table_format}"):
+            return path.with_name(path.name.removesuffix(f".{table_format}"))
+    return path
+
+
+def get_table_path(path: str | Path, table_format: TableFormat) -> Path:
+    stem = get_table_stem(path)
+    return stem.with_name(f"{stem.name}.{table_format}")
+
+
+def resolve_table(path: str | Path) -> Path:
+    """Fastest up-to-date file storing the table of `path`, whatever its format suffix.
+
+    A columnar copy is only used when it is not older than the JSONL files next to it, so that
+    editing a JSONL file by hand is never silently ignored. Of a plain and a compressed JSONL
+    file, the most recently written one is used.
+    """
+    jsonl_paths = [get_table_path(path, table_format) for table_format in JSONL_FORMATS]
+    jsonl_path = max(
+        (jsonl_path for jsonl_path in jsonl_paths if jsonl_path.exists()),
+        key=lambda jsonl_path: jsonl_path.stat().st_mtime,
+        default=None,
+    )
+    for table_format in TABLE_FORMATS:
+        table_path = get_table_path(path, table_format)
+        if table_format in JSONL_FORMATS:
+            if jsonl_path is not None:
+                return jsonl_path
+        elif table_path.exists() and (
+            jsonl_path is None or table_path.stat().st_mtime >= jsonl_path.stat().st_mtime
+        ):
+            return table_path
+    raise FileNotFoundError(f"No {'/'.join(TABLE_FORMATS)} table found for {path}")
+
+
+def open_jsonl(path: str | Path, mode: t.Literal["r", "w", "a"] = "r") -> t.TextIO:
+    """Open a JSONL file as text, (de)compressing `.jsonl.zst` files as a stream.
+
+    Lines are read or written one at a time, so memory stays flat whatever the file size.
+    """
+    path = Path(path)
+    if path.name.endswith(".jsonl.zst"):
+        return zstandard.open(
+            path, mode, cctx=zstandard.ZstdCompressor(level=settings.zstd_level), encoding="utf-8"
+        )
+    return open(path, mode, encoding="utf-8")
+
+
+def replace_durably(tmp_path: Path, path: Path) -> Path:
+    """Rename a fully written `tmp_path` over `path`, its data synced to disk first.
+
+    Without the syncs, a power loss could keep the rename but not the data it points to.
+    """
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    tmp_path.replace(path)
+    directory = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+    return path
+
+
+def find_tables(pattern: str) -> list[Path]:
+    """Tables matching a glob `pattern` (without format suffix), one file per table."""
+    stems = {
+        get_table_stem(path)
+        for table_format in TABLE_FORMATS
+        for path in glob.glob(f"{pattern}.{table_format}")
+    }
+    return [resolve_table(stem) for stem in sorted(stems)]
+
+
+def find_jsonl_files(pattern: str) -> list[Path]:
+    """JSONL files matching a glob `pattern` ending with `.jsonl`, compressed or not.
+
+    When a table is stored both ways, only its most recently written file is kept.
+    """
+    paths = {}
+    for path in sorted(map(Path, glob.glob(pattern) + glob.glob(f"{pattern}.zst"))):
+        name = get_table_path(path, "jsonl").name
+        if name not in paths or path.stat().st_mtime > paths[name].stat().st_mtime:
+            paths[name] = path
+    return [paths[name] for name in sorted(paths)]
+
+
+def check_jsonl_columns(path: str | Path, schema: pl.Schema):
+    """Raise if the first row of a JSONL file lacks a column of `schema`.
+
+    Polars fills the columns of a schema missing from JSONL rows with nulls, which would hide
+    a renamed or dropped column.
+    """
+    with open_jsonl(path) as f:
+        line = next((line for line in f if line.strip()), None)
+    if line is None:
+        return
+    missing = [name for name in schema.names() if name not in json.loads(line)]
+    if missing:
+        raise pl.exceptions.ColumnNotFoundError(
+            f"{path} has no {', '.join(map(repr, missing))} column, expected by its schema"
+        )
+
+
+def _read_compressed_jsonl(path: Path, schema: pl.Schema | None = None) -> pl.DataFrame:
+    """Read a `.jsonl.zst` file chunk by chunk: Polars would decompress it whole in memory."""
+    chunks = []
+    with open_jsonl(path) as f:
+        while lines := list(itertools.islice(f, JSONL_CHUNK_LINES)):
+            chunk = io.StringIO("".join(lines))
+            if schema is not None:
+                chunks.append(pl.read_ndjson(chunk, schema=schema))
+            else:
+                chunks.append(pl.read_ndjson(chunk, infer_schema_length=None))
+    if not chunks:
+        return pl.DataFrame(schema=schema)
+    # Without a schema, chunks may infer different dtypes for the same column.
+    return pl.concat(chunks, how="vertical" if schema is not None else "diagonal_relaxed")
+
+
+def scan_table(path: str | Path, schema: pl.Schema | None = None) -> pl.LazyFrame:
+    """Lazily read a table stored as Arrow IPC (memory-mapped), Parquet or (compressed) JSONL.
+
+    With a `schema` (see `layton_eval.schemas`), JSONL files are parsed without inference and
+    columnar files are checked against it: a missing column or a value that does not fit its
+    dtype raises instead of being silently inferred differently. Other columns are dropped.
+
+    Compressed JSONL files are decompressed and parsed chunk by chunk, they are not lazy.
+    """
+    path = resolve_table(path)
+    if path.suffix in (".jsonl", ".zst"):
+        if schema is not None:
+            check_jsonl_columns(path, schema)
+        if path.suffix == ".zst":
+            return _read_compressed_jsonl(path, schema).lazy()
+        if schema is not None:
+            return pl.scan_ndjson(path, schema=schema)
+        return pl.scan_ndjson(path, infer_schema_length=None)
+    if path.suffix == ".arrow":
+        lf = pl.scan_ipc(path, memory_map=True)
+    else:
+        lf = pl.scan_parquet(path)
+    if schema is not None:
+        lf = lf.select(pl.col(name).cast(dtype, strict=True) for name, dtype in schema.items())
+    return lf
+
+
+def read_table(
+    path: str | Path, columns: list[str] | None = None, schema: pl.Schema | None = None
+) -> pl.DataFrame:
+    """Read a table, see `resolve_table` for the file used and `scan_table` for `schema`."""
+    lf = scan_table(path, schema=schema)
+    return (lf.select(columns) if columns is not None else lf).collect()
+
+
+def read_tables(
+    paths: t.Sequence[str | Path],
+    include_file_paths: str | None = None,
+    schema: pl.Schema | None = None,
+) -> pl.DataFrame:
+    """Concatenation of several tables, optionally with the (JSONL) path each row comes from."""
+    if not paths:
+        return pl.DataFrame(schema=schema)
+    return pl.concat(
+        [
+            read_table(path, schema=schema).with_columns(
+                pl.lit(str(get_table_path(path, "jsonl"))).alias(include_file_paths)
+            )
+            if include_file_paths
+            else read_table(path, schema=schema)
+            for path in paths
+        ],
+        how="diagonal_relaxed",
+    )
+
+
+def write_table(df: pl.DataFrame, path: str | Path, table_format: TableFormat = "jsonl") -> Path:
+    """Write `df` under `path` with the suffix of `table_format`, and return the written path.
+
+    Arrow files are left uncompressed so that they can be memory-mapped by `read_table`, Parquet
+    and `jsonl.zst` files are compressed with zstd at `settings.zstd_level`.
+    """
+    path = get_table_path(path, table_format)
+    if table_format == "arrow":
+        df.write_ipc(path, compression="uncompressed")
+    elif table_format == "parquet":
+        df.write_parquet(path, compression="zstd", compression_level=settings.zstd_level)
+    elif table_format == "jsonl.zst":
+        # Polars would write to the underlying file descriptor, uncompressed: feed it in slices.
+        with open_jsonl(path, "w") as f:
+            for frame in df.iter_slices():
+                f.write(frame.write_ndjson())
+    else:
+        df.write_ndjson(path)
+    return path
@@ -0,0 +1,38 @@
+import numpy as np
+
+from layton_eval.bootstrap import (
+    get_rank_probabilities,
+    get_replicate_ranks,
+    get_win_probabilities,
+)
+
+
+def naive_ranks(point_estimates):
+    # Best rank of a tie: one plus the number of models scoring strictly higher.
+    return np.array(
+        [[1 + sum(other > value for other in row) for value in row] for row in point_estimates]
+    )
+
+
+def test_replicate_ranks_share_the_best_rank_of_ties():
+    point_estimates = np.array([[0.5, 0.7, 0.5, 0.1], [0.2, 0.2, 0.2, 0.9]])
+    ranks = get_replicate_ranks(point_estimates)
+    assert ranks.tolist() == [[2, 1, 2, 4], [2, 2, 2, 1]]
+
+
+def test_vectorised_statistics_match_a_loop_over_replicates():
+    rng = np.random.default_rng(0)
+    # Few distinct values, so that ties are frequent.
+    point_estimates = rng.integers(0, 4, size=(200, 5)).astype(float)
+    ranks = get_replicate_ranks(point_estimates)
+    assert (ranks == naive_ranks(point_estimates)).all()
+    n_boot, n_models = point_estimates.shape
+    rank_probabilities = np.zeros((n_models, n_models))
+    win_probabilities = np.zeros((n_models, n_models))
+    for row, row_ranks in zip(point_estimates, ranks):
+        for i in range(n_models):
+            rank_probabilities[i, row_ranks[i] - 1] += 1 / n_boot
+            for j in range(n_models):
+                win_probabilities[i, j] += (row[i] > row[j]) / n_boot
+    assert np.allclose(get_rank_probabilities(ranks), rank_probabilities)
+    assert np.allclose(get_win_probabilities(point_estimates), win_probabilities)
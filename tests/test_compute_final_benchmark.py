@@ -0,0 +1,73 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from layton_eval.bootstrap import get_human_field_name
+from layton_eval.calibration_index import FIELD_NAMES
+from layton_eval.compute_final_benchmark import (
+    get_multi_target_results,
+    merge_shards,
+    write_shard,
+)
+
+JUDGES = ("judge-a", "judge-b")
+N_BOOT = 2_500
+
+
+def make_ppi(n_riddles: int = 100) -> pl.DataFrame:
+    rng = np.random.default_rng(0)
+    rows = []
+    for provider, model in [("openai", "model-a"), ("mistral", "model-b"), ("google", "model-c")]:
+        for riddle in range(n_riddles):
+            verdicts = rng.random((len(FIELD_NAMES), len(JUDGES))) < 0.5
+            # Half of the riddles are annotated, so that every provider has a calibration pool.
+            is_labelled = riddle % 2 == 0
+            row = {
+                "riddle_id": f"{riddle:03d}",
+                "provider": provider,
+                "model": model,
+                "n_hints": 0,
+            }
+            for field_name, field_verdicts in zip(FIELD_NAMES, verdicts):
+                row[get_human_field_name(field_name)] = (
+                    bool(field_verdicts[0]) if is_labelled else None
+                )
+                row |= {
+                    f"{field_name}_{judge}": bool(verdict)
+                    for judge, verdict in zip(JUDGES, field_verdicts)
+                }
+            rows.append(row)
+    return pl.DataFrame(rows)
+
+
+def test_merged_shards_match_an_unsharded_run(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    df_ppi = make_ppi()
+    expected = get_multi_target_results(df_ppi, n_boot=N_BOOT, seed=1)
+    for shard in [(0, 2), (1, 2)]:
+        write_shard(
+            get_multi_target_results(df_ppi, n_boot=N_BOOT, seed=1, shard=shard),
+            "llm",
+            shard,
+            seed=1,
+            n_boot=N_BOOT,
+        )
+    merged = merge_shards(["replicates_llm_0-of-2.arrow", "replicates_llm_1-of-2.arrow"])
+    assert merged.drop("split").equals(expected.select(merged.drop("split").columns))
+
+
+def test_shards_of_different_runs_are_rejected(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    df_ppi = make_ppi()
+    for shard, seed in [((0, 2), 1), ((1, 2), 2)]:
+        write_shard(
+            get_multi_target_results(df_ppi, n_boot=N_BOOT, seed=seed, shard=shard),
+            "llm",
+            shard,
+            seed=seed,
+            n_boot=N_BOOT,
+        )
+    with pytest.raises(ValueError, match="different runs"):
+        merge_shards(["replicates_llm_0-of-2.arrow", "replicates_llm_1-of-2.arrow"])
+    with pytest.raises(ValueError, match="more than once"):
+        merge_shards(["replicates_llm_0-of-2.arrow", "replicates_llm_0-of-2.arrow"])
@@ -0,0 +1,37 @@
+import json
+
+import polars as pl
+
+from layton_eval import judgement_cache
+
+JUDGE = "gpt-5.1-2025-11-13"
+VALID_ANSWER = json.dumps({"is_answer_correct": True, "is_justification_correct": False})
+
+
+def use_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(judgement_cache, "JUDGEMENT_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(judgement_cache, "JUDGEMENT_CACHE_PATH", tmp_path / "judgements")
+
+
+def test_malformed_judgements_are_requested_again(monkeypatch, tmp_path):
+    use_cache_dir(monkeypatch, tmp_path)
+    results = pl.DataFrame(
+        {
+            "input_hash": ["valid", "malformed", "refused", "failed"],
+            "model": [JUDGE] * 4,
+            "answer": [VALID_ANSWER, '{"is_answer_correct": tru', "I cannot judge this.", None],
+        },
+        schema={"input_hash": pl.String, "model": pl.String, "answer": pl.String},
+    )
+    judgement_cache.update_judgement_cache(results)
+    requests = pl.DataFrame({"input_hash": ["valid", "malformed", "refused", "failed"]})
+    next_run = judgement_cache.filter_cache_misses(requests, [JUDGE])
+    assert next_run["input_hash"].to_list() == ["malformed", "refused", "failed"]
+
+
+def test_previously_cached_malformed_judgements_are_ignored(monkeypatch, tmp_path):
+    use_cache_dir(monkeypatch, tmp_path)
+    pl.DataFrame(
+        {"input_hash": ["valid", "malformed"], "model": [JUDGE] * 2, "answer": [VALID_ANSWER, "{"]}
+    ).write_ndjson(tmp_path / "judgements.jsonl")
+    assert judgement_cache.read_judgement_cache()["input_hash"].to_list() == ["valid"]
@@ -0,0 +1,31 @@
+import json
+
+import polars as pl
+
+from layton_eval.raw_requests import image_part, raw_request, text_part
+
+
+def test_null_parts_are_skipped():
+    df = pl.DataFrame(
+        {"text": ["hello", None], "url": [None, "layton-image:abc"]},
+        schema={"text": pl.String, "url": pl.String},
+    )
+    lines = df.select(
+        raw_request(
+            pl.lit('"prompt"'),
+            [text_part(pl.col("text")), image_part(pl.col("url"))],
+            request_id=pl.lit("id"),
+        )
+    ).to_series()
+    assert [json.loads(line)["messages"][0]["content"] for line in lines] == [
+        [{"type": "text", "text": "hello"}],
+        [{"type": "image_url", "image_url": {"url": "layton-image:abc"}}],
+    ]
+
+
+def test_text_part_of_null_is_null():
+    df = pl.DataFrame({"text": [None, 'say "hi"']}, schema={"text": pl.String})
+    assert df.select(text_part(pl.col("text"))).to_series().to_list() == [
+        None,
+        '{"type": "text", "text": "say \\"hi\\""}',
+    ]